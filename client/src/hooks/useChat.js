@@ -1,5 +1,5 @@
 import { useState, useRef, useEffect } from 'react';
-import { createNewChat, sendChatMessage, getTables, getChatHistory, sendGlobalChatMessage } from '../services/api';
+import { createNewChat, sendChatMessage, getFollowups, getTables, getChatHistory, sendGlobalChatMessage } from '../services/api';
 import { generateTableName } from '../config/constants';
 import { toast } from 'sonner';
 import posthog from 'posthog-js';
@@ -325,6 +325,21 @@ export const useChat = () => {
             chat.id === activeChat.id ? finalChat : chat
         ));
         setActiveChat(finalChat);
+        if (response.messageId) {
+            // followups are generated after the answer; attach them once ready
+            getFollowups(response.messageId)
+                .then(followups => {
+                    const withFollowups = (chat) => chat.id !== activeChat.id ? chat : {
+                        ...chat,
+                        messages: chat.messages.map(message =>
+                            message.id === aiMessage.id ? { ...message, followups } : message
+                        )
+                    };
+                    setChats(prev => prev.map(withFollowups));
+                    setActiveChat(prev => prev ? withFollowups(prev) : prev);
+                })
+                .catch(error => console.error('Failed to get followups:', error));
+        }
         return response.followups;
     } catch (error) {
         console.error('Failed to get response:', error);
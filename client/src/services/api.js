@@ -13,12 +13,14 @@ const commonOptions = {
     credentials: 'omit', // Changed from 'include' to 'omit' to avoid CORS issues
 };
 
-export const createNewChat = async (candidatesFile, jdFile, tableName) => {
+// mode 'append' adds only new candidates to an existing table; jdFile is optional then
+export const createNewChat = async (candidatesFile, jdFile, tableName, mode = 'replace') => {
     try {
         const formData = new FormData();
         formData.append('csv', candidatesFile);
-        formData.append('pdf', jdFile);
+        if (jdFile) formData.append('pdf', jdFile);
         formData.append('tableName', tableName);
+        formData.append('mode', mode);
 
         const response = await fetch(`${BACKEND_URL}/newChat`, {
             method: 'POST',
@@ -34,13 +36,43 @@ export const createNewChat = async (candidatesFile, jdFile, tableName) => {
         }
 
         const data = await response.json();
-        return data.result;
+        const job = await waitForJob(data.job_id);
+        return job.result;
     } catch (error) {
         console.error('Error creating new chat:', error);
         throw error;
     }
 };
 
+export const getJobStatus = async (jobId) => {
+    const response = await fetch(`${BACKEND_URL}/jobs/${encodeURIComponent(jobId)}`, {
+        method: 'GET',
+        headers: {
+            ...commonHeaders,
+            'Content-Type': 'application/json',
+        },
+        ...commonOptions,
+    });
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || 'Failed to get job status');
+    }
+    return data;
+};
+
+// Polls an ingestion job until it finishes; onProgress receives every status update
+export const waitForJob = async (jobId, onProgress, intervalMs = 2000) => {
+    while (true) {
+        const job = await getJobStatus(jobId);
+        if (onProgress) onProgress(job);
+        if (job.status === 'completed') return job;
+        if (job.status === 'failed') {
+            throw new Error(job.error || 'Ingestion job failed');
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+};
+
 export const sendChatMessage = async (tableName, query) => {
     try {
         const response = await fetch(`${BACKEND_URL}/chat`, {
@@ -56,10 +88,11 @@ export const sendChatMessage = async (tableName, query) => {
             throw new Error('Failed to send message');
         }
         const data = await response.json();
-        // Handle both {result, followups} and {result} (canned_response)
+        // sql answers carry a messageId; their followups are fetched with getFollowups
         return {
             result: data.result,
-            followups: data.followups
+            followups: data.followups,
+            messageId: data.message_id
         };
     } catch (error) {
         console.error('Error sending message:', error);
@@ -67,6 +100,23 @@ export const sendChatMessage = async (tableName, query) => {
     }
 };
 
+// Long-polls the server for the followup questions generated for an answer
+export const getFollowups = async (messageId, waitSeconds = 20) => {
+    const response = await fetch(`${BACKEND_URL}/followups/${encodeURIComponent(messageId)}?wait=${waitSeconds}`, {
+        method: 'GET',
+        headers: {
+            ...commonHeaders,
+            'Content-Type': 'application/json',
+        },
+        ...commonOptions,
+    });
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || 'Failed to get followups');
+    }
+    return data.status === 'ready' ? data.followups : [];
+};
+
 export const getTables = async () => {
     try {
         const response = await fetch(`${BACKEND_URL}/gettables`, {
@@ -4,6 +4,7 @@ import os
 from dotenv import load_dotenv
 from routes.chat_routes import chat_bp
 from routes.auth_routes import auth_bp
+from routes.metrics_routes import metrics_bp
 
 load_dotenv()
 
@@ -12,6 +13,7 @@ CORS(app)
 
 app.register_blueprint(chat_bp)
 app.register_blueprint(auth_bp)
+app.register_blueprint(metrics_bp)
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
@@ -0,0 +1,434 @@
+"""
+Offline throughput benchmark for ChatService.process_new_chat.
+
+Resumes are synthetic PDFs served from a local HTTP server, litellm.completion is
+replaced by a stub with configurable latency, and candidates are written to the
+Postgres database given by --database-url (or $BENCH_DATABASE_URL) -- point it at a
+local throwaway database. The benchmark creates and drops tables and deletes rows
+there, so it never falls back to the app's $CONNECTION_URL. No Gemini quota is used.
+
+Every (CSV size, worker count) case runs in a fresh process so module-level
+settings and peak RSS are measured per case:
+
+    cd server
+    python -m benchmarks.ingestion_benchmark --sizes 50,200 --workers 1,8,32 \\
+        --llm-latency 0.8 --download-latency 0.05 --mode single --json results.json
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+from dotenv import dotenv_values
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+SKILLS = [
+    "python", "java", "sql", "aws", "docker", "kubernetes", "react", "pandas",
+    "machine learning", "nlp", "spark", "airflow", "django", "flask", "go",
+]
+
+BENCH_JD = """
+Senior Backend Engineer. We are looking for an engineer with strong Python, SQL and
+AWS experience who has shipped services with Docker and Kubernetes. Experience with
+machine learning pipelines, Spark or Airflow is a plus. 5+ years of experience.
+"""
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(lines):
+    """Builds a minimal single-page PDF whose text layer holds `lines`."""
+    content = "BT /F1 10 Tf 50 780 Td 13 TL " + " ".join(
+        f"({_pdf_escape(line)}) '" for line in lines
+    ) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        "/Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode("latin-1")
+    return out
+
+
+def synthetic_resume(number):
+    rng = random.Random(number)
+    skills = rng.sample(SKILLS, rng.randint(2, 7))
+    lines = [
+        f"Name: Candidate {number}",
+        f"Email: candidate{number}@bench.example.com",
+        f"Phone: +1 555 {number:07d}",
+        f"Skills: {', '.join(skills)}",
+        f"Experience: {rng.randint(1, 12)} years building backend systems",
+    ]
+    for year in range(rng.randint(3, 12)):
+        lines.append(
+            f"{2024 - year}: worked on {rng.choice(skills)} services and {rng.choice(SKILLS)} tooling"
+        )
+    lines.append("Education: B.Tech in Computer Science")
+    return make_pdf(lines)
+
+
+class ResumeServer:
+    """Serves /bench/<run>/<n>.pdf with an optional per-request delay."""
+
+    def __init__(self, latency=0.0):
+        latency_seconds = latency
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                match = re.match(r"^/bench/[\w-]+/(\d+)\.pdf$", self.path)
+                if not match:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                if latency_seconds:
+                    time.sleep(latency_seconds)
+                body = synthetic_resume(int(match.group(1)))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+class FakeCompletion:
+    """Stands in for litellm.completion, answering each known prompt shape after `latency` seconds."""
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _fields(self, text):
+        name = re.search(r"Name: (.+)", text)
+        email = re.search(r"Email: (\S+)", text)
+        skills = re.search(r"Skills: (.+)", text)
+        return {
+            "name": name.group(1).strip() if name else "",
+            "email": email.group(1).strip() if email else "",
+            "phone": "",
+            "skills": skills.group(1).strip() if skills else "",
+            "experience": "Backend engineering",
+            "education": "B.Tech",
+        }
+
+    def _answer(self, prompt):
+        if "determine what columns" in prompt:
+            return json.dumps(
+                ["name", "email", "phone", "skills", "experience", "education"]
+            )
+        if "keyed by candidate id" in prompt:
+            sections = re.split(r"=== Candidate (C\d+) ===", prompt)
+            return json.dumps(
+                {
+                    sections[i]: self._fields(sections[i + 1])
+                    for i in range(1, len(sections) - 1, 2)
+                }
+            )
+        if '"rationale"' in prompt:
+            return json.dumps(
+                {
+                    "fields": self._fields(prompt),
+                    "score": round(random.uniform(20, 95), 1),
+                    "rationale": "Synthetic benchmark score.",
+                }
+            )
+        if "Calculate a match score" in prompt:
+            return str(round(random.uniform(20, 95), 1))
+        if "Extract candidate information" in prompt:
+            return json.dumps(self._fields(prompt))
+        return "ok"
+
+    def __call__(self, model=None, messages=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        prompt = "\n".join(message.get("content", "") for message in messages or [])
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self._answer(prompt)))]
+        )
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def write_csv(path, size, base_url, run):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "pdf_url"])
+        for number in range(size):
+            writer.writerow([f"Candidate {number}", f"{base_url}/bench/{run}/{number}.pdf"])
+
+
+def _prepare_database(database_url):
+    import psycopg2
+
+    connection = psycopg2.connect(database_url)
+    try:
+        cursor = connection.cursor()
+        cursor.execute("CREATE SCHEMA IF NOT EXISTS private")
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS private.candidates (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                resume_link TEXT,
+                resume_text TEXT
+            )
+        """
+        )
+        connection.commit()
+        cursor.close()
+    finally:
+        connection.close()
+
+
+def _cleanup_database(database_url, table_name, base_url):
+    import psycopg2
+
+    connection = psycopg2.connect(database_url)
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        cursor.execute("DELETE FROM private.jobDesc WHERE table_name = %s", (table_name,))
+        cursor.execute(
+            "DELETE FROM private.candidates WHERE resume_link LIKE %s",
+            (f"{base_url}/bench/%",),
+        )
+        connection.commit()
+        cursor.close()
+    finally:
+        connection.close()
+
+
+def run_case(case, results):
+    """Runs one benchmark case; executed in a fresh process."""
+    os.environ["CONNECTION_URL"] = case["database_url"]
+    os.environ["RESUME_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-resume-cache-")
+    os.environ["INGEST_EXTRACTION_MODE"] = case["mode"]
+    os.environ["PRESCREEN_THRESHOLD"] = str(case["prescreen_threshold"])
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    # the fake LLM has no quota, so the shared limiter should not shape the run
+    os.environ["LLM_REQUESTS_PER_MINUTE"] = "0"
+    os.environ["LLM_TOKENS_PER_MINUTE"] = "0"
+    os.environ["LLM_MAX_CONCURRENCY"] = "1024"
+
+    import litellm
+
+    fake = FakeCompletion(case["llm_latency"], case["llm_jitter"])
+    litellm.completion = fake
+
+    from services.chat_service import ChatService
+    from services.csv_stream import CandidateCsvReader
+    from services.ingestion_pipeline import IngestionProgress
+
+    _prepare_database(case["database_url"])
+    table_name = f"bench_{case['size']}_{case['workers']}_{case['run'][:8]}"
+    csv_path = os.path.join(tempfile.mkdtemp(prefix="bench-csv-"), "candidates.csv")
+    write_csv(csv_path, case["size"], case["base_url"], case["run"])
+
+    service = ChatService()
+    candidates = CandidateCsvReader(csv_path)
+    progress = IngestionProgress(case["size"], keep_samples=True)
+    started = time.perf_counter()
+    try:
+        service.process_new_chat(
+            candidates, BENCH_JD, table_name, workers=case["workers"], progress=progress
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        _cleanup_database(case["database_url"], table_name, case["base_url"])
+
+    stages = {}
+    for name in progress.stages:
+        samples = progress.stage_samples(name)
+        stages[name] = {
+            "p50": round(percentile(samples, 50), 4),
+            "p95": round(percentile(samples, 95), 4),
+        }
+
+    results.put(
+        {
+            "size": case["size"],
+            "workers": case["workers"],
+            "mode": case["mode"],
+            "processed": progress.processed,
+            "failed": progress.failed,
+            "seconds": round(elapsed, 3),
+            "candidates_per_sec": round(progress.processed / elapsed, 3) if elapsed else 0.0,
+            "llm_calls": fake.calls,
+            "stages": stages,
+            # ru_maxrss is in KiB on Linux
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "peak_child_rss_mb": round(
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1
+            ),
+        }
+    )
+
+
+def print_report(rows):
+    stage_names = []
+    for row in rows:
+        for name in row["stages"]:
+            if name not in stage_names:
+                stage_names.append(name)
+
+    header = ["size", "workers", "ok", "fail", "sec", "cand/s", "rss MB"] + [
+        f"{name} p50/p95" for name in stage_names
+    ]
+    print(" | ".join(header))
+    for row in rows:
+        cells = [
+            str(row["size"]),
+            str(row["workers"]),
+            str(row["processed"]),
+            str(row["failed"]),
+            f"{row['seconds']:.1f}",
+            f"{row['candidates_per_sec']:.2f}",
+            f"{row['peak_rss_mb']:.0f}",
+        ]
+        for name in stage_names:
+            stage = row["stages"].get(name)
+            cells.append(f"{stage['p50']:.3f}/{stage['p95']:.3f}" if stage else "-")
+        print(" | ".join(cells))
+
+
+def _database_identity(database_url):
+    """(host, port, database) of a Postgres URL, so differently spelled URLs compare equal."""
+    parsed = urlparse(database_url)
+    host = (parsed.hostname or "localhost").lower()
+    if host in ("127.0.0.1", "::1"):
+        host = "localhost"
+    return host, parsed.port or 5432, parsed.path.lstrip("/")
+
+
+def _app_database_urls():
+    """The app's CONNECTION_URL from the environment and from server/.env."""
+    urls = [
+        os.getenv("CONNECTION_URL"),
+        dotenv_values(os.path.join(SERVER_DIR, ".env")).get("CONNECTION_URL"),
+    ]
+    return [url for url in urls if url]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="50,200", help="comma separated CSV row counts")
+    parser.add_argument("--workers", default="1,8,32", help="comma separated INGEST_WORKERS values")
+    parser.add_argument("--mode", default="single", choices=["single", "batch", "fused"])
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--download-latency", type=float, default=0.05)
+    parser.add_argument("--prescreen-threshold", type=float, default=0)
+    parser.add_argument(
+        "--database-url",
+        default=os.getenv("BENCH_DATABASE_URL"),
+        help="throwaway database; tables are created and dropped there",
+    )
+    parser.add_argument("--json", help="write the raw results to this file")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("--database-url (or BENCH_DATABASE_URL) is required")
+    target = _database_identity(args.database_url)
+    if any(_database_identity(url) == target for url in _app_database_urls()):
+        parser.error("--database-url must not be the app's CONNECTION_URL database")
+
+    server = ResumeServer(args.download_latency)
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    try:
+        for size in [int(value) for value in args.sizes.split(",")]:
+            for workers in [int(value) for value in args.workers.split(",")]:
+                case = {
+                    "size": size,
+                    "workers": workers,
+                    "mode": args.mode,
+                    "llm_latency": args.llm_latency,
+                    "llm_jitter": args.llm_jitter,
+                    "prescreen_threshold": args.prescreen_threshold,
+                    "database_url": args.database_url,
+                    "base_url": server.base_url,
+                    "run": uuid.uuid4().hex,
+                }
+                print(f"Running size={size} workers={workers} mode={args.mode}...")
+                results = context.Queue()
+                process = context.Process(target=run_case, args=(case, results))
+                process.start()
+                # drain before joining so a large result cannot block the child
+                row = None
+                while row is None and (process.is_alive() or not results.empty()):
+                    try:
+                        row = results.get(timeout=1)
+                    except queue.Empty:
+                        pass
+                process.join()
+                if row is None:
+                    print(f"Case size={size} workers={workers} failed (exit {process.exitcode})")
+                    continue
+                rows.append(row)
+    finally:
+        server.close()
+
+    print()
+    print_report(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
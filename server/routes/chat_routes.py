@@ -1,8 +1,17 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from services.chat_service import ChatService
 from services.insights_service import InsightsService
 from services.peoples_api import PeoplesApi
+from services.job_service import JobService, JobConflictError
+from services.csv_stream import CandidateCsvReader
+from services.pdf_extractor import pdf_extractor
+from services.ingestion_checkpoint import ingestion_run_id
+from services.llm_gateway import llm_gateway
+from services.followup_service import followup_service
+from services.prompt_compactor import prompt_compactor
+from services.metrics import CHAT_STAGE_SECONDS
 import os
+import shutil
 import pandas as pd
 from werkzeug.utils import secure_filename
 import tempfile
@@ -11,11 +20,70 @@ from PyPDF2 import PdfReader
 import sqlite3
 import json
 import traceback
+import threading
+import queue
 
 chat_bp = Blueprint("chat", __name__)
 chat_service = ChatService()
 insights_service = InsightsService()
 peoples_api = PeoplesApi()
+job_service = JobService()
+
+FOLLOWUP_STREAM_TIMEOUT = float(os.getenv("FOLLOWUP_STREAM_TIMEOUT", 30))
+FOLLOWUP_MAX_WAIT = float(os.getenv("FOLLOWUP_MAX_WAIT", 30))
+
+
+def _wants_stream(data):
+    return bool(data.get("stream")) or "text/event-stream" in request.headers.get(
+        "Accept", ""
+    )
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _event_stream(worker):
+    """
+    Runs `worker(emit)` on a background thread and relays everything it emits as
+    server-sent events. Its return value becomes the final "done" event.
+    """
+    events = queue.Queue()
+
+    def emit(event, data):
+        events.put((event, data))
+
+    def run():
+        try:
+            emit("done", worker(emit))
+        except Exception as e:
+            print(f"Streaming worker failed: {traceback.format_exc()}")
+            emit("error", {"error": str(e)})
+        finally:
+            events.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+
+    def generate():
+        while True:
+            item = events.get()
+            if item is None:
+                break
+            yield _sse_event(*item)
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _chat_payload(result):
+    if isinstance(result, dict) and "message_id" in result:
+        return {"result": result["response"], "message_id": result["message_id"]}
+    if isinstance(result, dict) and "canned_response" in result:
+        return {"result": result["canned_response"]}
+    return {"result": result}
 
 
 @chat_bp.route("/insights", methods=["GET"])
@@ -54,18 +122,46 @@ def chat():
         if not table_name or not query:
             return jsonify({"error": "Missing tableName or query"}), 400
 
-        result = chat_service.process_query(table_name, query, user_id)
+        if _wants_stream(data):
+
+            def answer(emit):
+                with CHAT_STAGE_SECONDS.time(stage="total"):
+                    result = chat_service.process_query(table_name, query, user_id, emit)
+                payload = _chat_payload(result)
+                if "message_id" in payload:
+                    # the answer is complete; followups arrive as a later event
+                    emit("answer", payload)
+                    emit(
+                        "followups",
+                        followup_service.get(
+                            payload["message_id"], timeout=FOLLOWUP_STREAM_TIMEOUT
+                        ),
+                    )
+                return payload
+
+            return _event_stream(answer)
+
+        with CHAT_STAGE_SECONDS.time(stage="total"):
+            result = chat_service.process_query(table_name, query, user_id)
         print("here with the rsult - ", result)
-        if "followups" in result:
-            return jsonify(
-                {"result": result["response"], "followups": result["followups"]}
-            )
-        if "canned_response" in result:
-            return jsonify({"result": result["canned_response"]})
+        return jsonify(_chat_payload(result))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@chat_bp.route("/followups/<message_id>", methods=["GET"])
+def get_followups(message_id):
+    try:
+        wait = min(float(request.args.get("wait", 0)), FOLLOWUP_MAX_WAIT)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+
+    followups = followup_service.get(message_id, timeout=wait)
+    if followups["status"] == "unknown":
+        return jsonify({"error": "Unknown message id"}), 404
+    return jsonify(followups)
+
+
 @chat_bp.route("/get-chats", methods=["GET"])
 def getChats():
     try:
@@ -101,43 +197,83 @@ def sendEmail():
 @chat_bp.route("/newChat", methods=["POST"])
 def new_chat():
     try:
-        if "csv" not in request.files or "pdf" not in request.files:
+        mode = request.form.get("mode", "replace")
+        if mode not in ("replace", "append"):
+            return jsonify({"error": "mode must be 'replace' or 'append'"}), 400
+
+        # appending to an existing table can reuse its stored job description
+        if "csv" not in request.files or (
+            "pdf" not in request.files and mode != "append"
+        ):
             return jsonify({"error": "Missing CSV or PDF file"}), 400
 
         csv_file = request.files["csv"]
-        pdf_file = request.files["pdf"]
+        pdf_file = request.files.get("pdf")
         table_name = request.form.get("tableName")
 
         if not table_name:
             return jsonify({"error": "Missing tableName"}), 400
 
         temp_dir = tempfile.mkdtemp()
-        csv_path = os.path.join(temp_dir, secure_filename(csv_file.filename))
-        pdf_path = os.path.join(temp_dir, secure_filename(pdf_file.filename))
-
-        csv_file.save(csv_path)
-        pdf_file.save(pdf_path)
-
-        df = pd.read_csv(csv_path)
-
-        pdf_reader = PdfReader(pdf_path)
-        jd_text = ""
-        for page in pdf_reader.pages:
-            jd_text += page.extract_text()
 
-        result = chat_service.process_new_chat(df, jd_text, table_name)
+        def cleanup():
+            shutil.rmtree(temp_dir, ignore_errors=True)
 
-        os.remove(csv_path)
-        os.remove(pdf_path)
-        os.rmdir(temp_dir)
+        # until the job owns the uploads, every exit path removes them
+        try:
+            csv_path = os.path.join(temp_dir, secure_filename(csv_file.filename))
+            csv_file.save(csv_path)
+
+            candidates = CandidateCsvReader(csv_path)
+            try:
+                candidates.validate()
+            except ValueError as e:
+                cleanup()
+                return jsonify({"error": str(e)}), 400
+
+            jd_text = ""
+            if pdf_file:
+                pdf_path = os.path.join(temp_dir, secure_filename(pdf_file.filename))
+                pdf_file.save(pdf_path)
+                jd_text = pdf_extractor.extract(pdf_path)["text"]
+
+            # re-uploading the same files resumes an interrupted run
+            run_id = ingestion_run_id(table_name, mode, jd_text, csv_path)
+
+            def ingest(progress):
+                progress.expected_total = candidates.count_rows()
+                return chat_service.process_new_chat(
+                    candidates,
+                    jd_text,
+                    table_name,
+                    progress=progress,
+                    mode=mode,
+                    run_id=run_id,
+                )
+
+            job = job_service.submit(table_name, ingest, on_done=cleanup)
+        except JobConflictError as e:
+            cleanup()
+            return jsonify({"error": str(e), "job_id": e.job.id}), 409
+        except Exception:
+            cleanup()
+            raise
 
-        return jsonify({"result": result})
+        return jsonify({"job_id": job.id, "run_id": run_id, "status": job.status}), 202
     except Exception as e:
         tb = traceback.format_exc()
         print(f"/newChat error: {tb}")
         return jsonify({"error": str(e), "traceback": tb}), 500
 
 
+@chat_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_service.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+
 @chat_bp.route("/gettables", methods=["GET"])
 def get_tables():
     try:
@@ -157,6 +293,174 @@ def get_jobDesc():
         return jsonify({"error": str(e)}), 500
 
 
+def _talent_search(prompt, chat_context, emit=None):
+    """Turns a prompt into a People Data Labs search and a recruiter summary of the hits."""
+    # Build context from previous chats
+    context_string = ""
+    if chat_context and len(chat_context) > 0:
+        context_string = "\n\nPrevious conversation context:\n"
+        for i, chat in enumerate(chat_context[-5:], 1):  # Last 5 chats
+            if (
+                isinstance(chat, dict)
+                and "user_message" in chat
+                and "assistant_message" in chat
+            ):
+                context_string += f"{i}. User: {chat['user_message']}\n   Assistant: {prompt_compactor.compact(chat['assistant_message'], 'answer')}\n"
+            elif isinstance(chat, dict) and "user" in chat and "assistant" in chat:
+                context_string += f"{i}. User: {chat['user']}\n   Assistant: {prompt_compactor.compact(chat['assistant'], 'answer')}\n"
+
+    # Person schema summary for Gemini
+
+    gemini_instruction = f"""
+    You are an expert at generating Elasticsearch queries for a specific API. Your task is to analyze the user's prompt and classify it into one of two categories: "Talent Search" or "Background Verification".
+
+    Based on the classification, generate a precise JSON Elasticsearch query using ONLY the structures provided below.
+
+    **1. Intent Classification:**
+    - **Talent Search**: User is looking for candidates with specific skills, experience, or location.
+    - **Background Verification**: User is searching for a specific person by name.
+
+    **2. Strict Query Generation Rules:**
+
+    **If "Talent Search", use this EXACT structure. Do not add other clauses:**
+    ```json
+    {{
+      "query": {{
+        "bool": {{
+          "must": [
+            {{ "term": {{ "location_locality": "mumbai" }} }},
+            {{ "range": {{ "inferred_years_experience": {{ "gte": 5 }} }} }},
+            {{
+              "bool": {{
+                "should": [
+                  {{ "match": {{ "job_title": "AI developer" }} }},
+                  {{ "match": {{ "skills": "artificial intelligence" }} }}
+                ]
+              }}
+            }}
+          ]
+        }}
+      }},
+      "size": 10
+    }}
+    ```
+
+    **If "Background Verification", use this EXACT structure:**
+    ```json
+    {{
+      "query": {{
+        "bool": {{
+          "must": [
+            {{ "match": {{ "first_name": "john" }} }},
+            {{ "match": {{ "last_name":"doe" }} }},
+          ]
+        }}
+      }},
+      "size": 1
+    }}
+    ```
+    
+    **CRITICAL INSTRUCTIONS:**
+    - Return **ONLY** the raw JSON query. No text, explanations, or markdown.
+    - **DO NOT** use any fields or clauses not present in the examples above. The `minimum_should_match` clause is **NOT SUPPORTED** and must not be used.
+    - Extract entities from the user's prompt (like location, skills, name) and place them into the templates.
+    
+    **Conversation Context:**
+    {context_string}
+
+    **Current User Prompt:**
+    "{prompt}"
+    """
+
+    content = llm_gateway.complete(
+        gemini_instruction, temperature=0, call_site="elastic_query"
+    )
+    if content.strip().startswith("```json"):
+        content = content.strip()[7:]
+    if content.strip().startswith("```"):
+        content = content.strip()[3:]
+    if content.strip().endswith("```"):
+        content = content.strip()[:-3]
+    content = content.strip()
+    try:
+        elastic_query = json.loads(content)
+    except Exception:
+        elastic_query = content  # Keep as string if not valid json
+
+    print("Generated Elasticsearch Query:", elastic_query)
+    if emit:
+        emit("elastic-query", {"query": elastic_query})
+
+    # Call People Data Labs API with the elastic query
+    peoples_data = peoples_api.fetch_peoples_data(elastic_query)
+
+    print("peoples data - ", peoples_data)
+    if emit:
+        emit("search-results", {"data": peoples_data})
+    # --- Enhanced Gemini summary for recruiter with LinkedIn/GitHub URLs ---
+    summary_prompt = f"""
+    You are an expert recruiter assistant. Given the following global talent data search results, create a comprehensive and well-structured response in markdown format.
+
+    Your response should include the following sections for each candidate:
+    
+    ## Candidate Profiles
+    For each person found, create a subsection using their actual name (e.g., ### John Doe). If no name is available, use "### Candidate [Number]". Then, list their details using bullet points with bolded labels.
+    
+    - **Name**: 
+    - **Current Role**:
+    - **Company**:
+    - **Location**:
+    - **Years of Experience**: (use 'inferred_years_experience' if available, otherwise calculate from experience)
+    - **Key Skills**: (list top 5-7 skills)
+    - **Contact**: (provide email if available, otherwise 'Not available')
+    - **Social Profiles**: 
+        - LinkedIn: [linkedin.com/in/username](https://linkedin.com/in/username)
+        - GitHub: [github.com/username](https://github.com/username)
+        - Twitter: [twitter.com/username](https://twitter.com/username)
+    - **Professional Links**:
+        - Company Website: [claravest.com](https://claravest.com)
+
+    ### Background Verification Report
+    This background verification report is based on publicly available information. For a comprehensive check, a third-party service is recommended.
+    
+    **Verification Process Overview:**
+    Our process involves cross-referencing information from professional networks like LinkedIn and code repositories like GitHub. We check for:
+    1.  **Work History Consistency**: Comparing roles and timelines on LinkedIn with resume data.
+    2.  **Technical Skills Validation**: Reviewing public activity on GitHub for evidence of claimed skills.
+    3.  **Online Presence Check**: A general search for any public information that might be relevant.
+
+    **Candidate-Specific Findings:**
+    - **LinkedIn Profile**: [Provide a brief analysis of the candidate's LinkedIn. Mention if it appears professional and consistent. e.g., "John Doe's LinkedIn profile is comprehensive and aligns with typical roles in their field."]
+    - **GitHub Activity**: [Analyze their GitHub profile. e.g., "The GitHub profile shows activity in repositories related to Python and Machine Learning, supporting their listed skills." or "No public GitHub profile was found."]
+    - **Overall Assessment**: [Give a summary. e.g., "Based on public profiles, the candidate presents a consistent and professional online presence. Further verification is recommended."]
+
+    **IMPORTANT FORMATTING RULES:**
+    - Always use proper markdown syntax
+    - Use ### for candidate names and the 'Background Verification Report' section.
+    - Use ** for bold labels
+    - Use - for bullet points
+    - Ensure all links are properly formatted as markdown links
+    - If the data is empty, simply state: "No candidates found matching your criteria."
+
+    Data:
+    {prompt_compactor.compact_json(peoples_data, "search_results")}
+    """
+    if emit:
+        chunks = []
+        for text in llm_gateway.stream(
+            summary_prompt, temperature=0.2, call_site="talent_summary"
+        ):
+            chunks.append(text)
+            emit("token", {"text": text})
+        summary_content = "".join(chunks)
+    else:
+        summary_content = llm_gateway.complete(
+            summary_prompt, temperature=0.2, call_site="talent_summary"
+        )
+
+    return {"summary": summary_content, "raw": peoples_data}
+
+
 @chat_bp.route("/chat/2", methods=["POST"])
 def chat_to_elastic():
     try:
@@ -166,173 +470,11 @@ def chat_to_elastic():
         if not prompt:
             return jsonify({"error": "Missing prompt"}), 400
 
-        # Build context from previous chats
-        context_string = ""
-        if chat_context and len(chat_context) > 0:
-            context_string = "\n\nPrevious conversation context:\n"
-            for i, chat in enumerate(chat_context[-5:], 1):  # Last 5 chats
-                if (
-                    isinstance(chat, dict)
-                    and "user_message" in chat
-                    and "assistant_message" in chat
-                ):
-                    context_string += f"{i}. User: {chat['user_message']}\n   Assistant: {chat['assistant_message']}\n"
-                elif isinstance(chat, dict) and "user" in chat and "assistant" in chat:
-                    context_string += f"{i}. User: {chat['user']}\n   Assistant: {chat['assistant']}\n"
-
-        # Person schema summary for Gemini
-
-        gemini_instruction = f"""
-        You are an expert at generating Elasticsearch queries for a specific API. Your task is to analyze the user's prompt and classify it into one of two categories: "Talent Search" or "Background Verification".
-
-        Based on the classification, generate a precise JSON Elasticsearch query using ONLY the structures provided below.
-
-        **1. Intent Classification:**
-        - **Talent Search**: User is looking for candidates with specific skills, experience, or location.
-        - **Background Verification**: User is searching for a specific person by name.
-
-        **2. Strict Query Generation Rules:**
-
-        **If "Talent Search", use this EXACT structure. Do not add other clauses:**
-        ```json
-        {{
-          "query": {{
-            "bool": {{
-              "must": [
-                {{ "term": {{ "location_locality": "mumbai" }} }},
-                {{ "range": {{ "inferred_years_experience": {{ "gte": 5 }} }} }},
-                {{
-                  "bool": {{
-                    "should": [
-                      {{ "match": {{ "job_title": "AI developer" }} }},
-                      {{ "match": {{ "skills": "artificial intelligence" }} }}
-                    ]
-                  }}
-                }}
-              ]
-            }}
-          }},
-          "size": 10
-        }}
-        ```
-
-        **If "Background Verification", use this EXACT structure:**
-        ```json
-        {{
-          "query": {{
-            "bool": {{
-              "must": [
-                {{ "match": {{ "first_name": "john" }} }},
-                {{ "match": {{ "last_name":"doe" }} }},
-              ]
-            }}
-          }},
-          "size": 1
-        }}
-        ```
-        
-        **CRITICAL INSTRUCTIONS:**
-        - Return **ONLY** the raw JSON query. No text, explanations, or markdown.
-        - **DO NOT** use any fields or clauses not present in the examples above. The `minimum_should_match` clause is **NOT SUPPORTED** and must not be used.
-        - Extract entities from the user's prompt (like location, skills, name) and place them into the templates.
-        
-        **Conversation Context:**
-        {context_string}
-
-        **Current User Prompt:**
-        "{prompt}"
-        """
-
-        from langchain_google_genai import ChatGoogleGenerativeAI
-        import os
-        import json
-
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
-            temperature=0,
-        )
-        response = llm.invoke(gemini_instruction)
-        content = response.content if hasattr(response, "content") else str(response)
-        if content.strip().startswith("```json"):
-            content = content.strip()[7:]
-        if content.strip().startswith("```"):
-            content = content.strip()[3:]
-        if content.strip().endswith("```"):
-            content = content.strip()[:-3]
-        content = content.strip()
-        try:
-            elastic_query = json.loads(content)
-        except Exception:
-            elastic_query = content  # Keep as string if not valid json
-
-        print("Generated Elasticsearch Query:", elastic_query)
-
-        # Call People Data Labs API with the elastic query
-        peoples_data = peoples_api.fetch_peoples_data(elastic_query)
-
-        print("peoples data - ", peoples_data)
-        # --- Enhanced Gemini summary for recruiter with LinkedIn/GitHub URLs ---
-        summary_prompt = f"""
-        You are an expert recruiter assistant. Given the following global talent data search results, create a comprehensive and well-structured response in markdown format.
-
-        Your response should include the following sections for each candidate:
-        
-        ## Candidate Profiles
-        For each person found, create a subsection using their actual name (e.g., ### John Doe). If no name is available, use "### Candidate [Number]". Then, list their details using bullet points with bolded labels.
-        
-        - **Name**: 
-        - **Current Role**:
-        - **Company**:
-        - **Location**:
-        - **Years of Experience**: (use 'inferred_years_experience' if available, otherwise calculate from experience)
-        - **Key Skills**: (list top 5-7 skills)
-        - **Contact**: (provide email if available, otherwise 'Not available')
-        - **Social Profiles**: 
-            - LinkedIn: [linkedin.com/in/username](https://linkedin.com/in/username)
-            - GitHub: [github.com/username](https://github.com/username)
-            - Twitter: [twitter.com/username](https://twitter.com/username)
-        - **Professional Links**:
-            - Company Website: [claravest.com](https://claravest.com)
-
-        ### Background Verification Report
-        This background verification report is based on publicly available information. For a comprehensive check, a third-party service is recommended.
-        
-        **Verification Process Overview:**
-        Our process involves cross-referencing information from professional networks like LinkedIn and code repositories like GitHub. We check for:
-        1.  **Work History Consistency**: Comparing roles and timelines on LinkedIn with resume data.
-        2.  **Technical Skills Validation**: Reviewing public activity on GitHub for evidence of claimed skills.
-        3.  **Online Presence Check**: A general search for any public information that might be relevant.
-
-        **Candidate-Specific Findings:**
-        - **LinkedIn Profile**: [Provide a brief analysis of the candidate's LinkedIn. Mention if it appears professional and consistent. e.g., "John Doe's LinkedIn profile is comprehensive and aligns with typical roles in their field."]
-        - **GitHub Activity**: [Analyze their GitHub profile. e.g., "The GitHub profile shows activity in repositories related to Python and Machine Learning, supporting their listed skills." or "No public GitHub profile was found."]
-        - **Overall Assessment**: [Give a summary. e.g., "Based on public profiles, the candidate presents a consistent and professional online presence. Further verification is recommended."]
-
-        **IMPORTANT FORMATTING RULES:**
-        - Always use proper markdown syntax
-        - Use ### for candidate names and the 'Background Verification Report' section.
-        - Use ** for bold labels
-        - Use - for bullet points
-        - Ensure all links are properly formatted as markdown links
-        - If the data is empty, simply state: "No candidates found matching your criteria."
-
-        Data:
-        {json.dumps(peoples_data)}
-        """
-        summary_llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
-            temperature=0.2,
-        )
-        summary_response = summary_llm.invoke(summary_prompt)
-        summary_content = (
-            summary_response.content
-            if hasattr(summary_response, "content")
-            else str(summary_response)
-        )
-
-        return jsonify({"summary": summary_content, "raw": peoples_data})
+        if _wants_stream(data):
+            return _event_stream(
+                lambda emit: {"result": _talent_search(prompt, chat_context, emit)}
+            )
+        return jsonify(_talent_search(prompt, chat_context))
     except Exception as e:
         tb = traceback.format_exc()
         print(f"/chat/2 error: {tb}")
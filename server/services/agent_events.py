@@ -0,0 +1,84 @@
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from services.metrics import CHAT_STAGE_SECONDS, LLM_TOKENS
+from services.prompt_compactor import count_tokens, prompt_budget
+
+
+class AgentEventHandler(BaseCallbackHandler):
+    """
+    Forwards SQL agent progress to an `emit(event, data)` callback for streaming,
+    and records agent LLM/tool timings, token usage and iteration counts.
+    `cacheable_sql` is the agent's last executed query, provided it succeeded
+    and its result fits the sql_rows budget; earlier, exploratory queries never
+    count.
+    """
+
+    def __init__(self, emit):
+        self.emit = emit
+        self.iterations = 0
+        self.last_sql = None
+        self.last_sql_ok = False
+        self._pending_sql = None
+        self._started = {}
+
+    @property
+    def cacheable_sql(self):
+        return self.last_sql if self.last_sql_ok else None
+
+    def on_chat_model_start(self, serialized, messages, run_id=None, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, run_id=None, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token, **kwargs):
+        # tool-call turns stream empty content, so only answer text gets through
+        if token:
+            self.emit("token", {"text": token})
+
+    def on_llm_end(self, response, run_id=None, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            CHAT_STAGE_SECONDS.observe(time.perf_counter() - started, stage="agent_llm")
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.inc(usage.get("input_tokens", 0), call_site="sql_agent", direction="in")
+                    LLM_TOKENS.inc(usage.get("output_tokens", 0), call_site="sql_agent", direction="out")
+
+    def on_agent_action(self, action, **kwargs):
+        self.iterations += 1
+        if action.tool == "sql_db_query":
+            self._pending_sql = action.tool_input
+
+    def on_tool_start(self, serialized, input_str, run_id=None, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def _finish_sql(self, ok):
+        query = self._pending_sql
+        if isinstance(query, dict):
+            query = query.get("query", str(query))
+        self.last_sql = query
+        self.last_sql_ok = ok
+        self._pending_sql = None
+        return query
+
+    def on_tool_end(self, output, run_id=None, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            CHAT_STAGE_SECONDS.observe(time.perf_counter() - started, stage="agent_tool")
+        if self._pending_sql is not None:
+            # results too big for the sql_rows budget cannot be answered from cache
+            query = self._finish_sql(
+                not str(output).startswith("Error")
+                and count_tokens(str(output)) <= prompt_budget("sql_rows")
+            )
+            self.emit("sql-executed", {"query": query})
+
+    def on_tool_error(self, error, run_id=None, **kwargs):
+        self._started.pop(run_id, None)
+        if self._pending_sql is not None:
+            self._finish_sql(False)
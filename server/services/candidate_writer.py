@@ -0,0 +1,128 @@
+import hashlib
+import os
+import re
+import threading
+import uuid
+from psycopg2.extras import execute_values
+
+INGEST_INSERT_BATCH = int(os.getenv("INGEST_INSERT_BATCH", 50))
+
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def normalize_email(email):
+    """Returns the lowercased address, or "" for placeholders like "N/A" that are not one."""
+    email = str(email or "").strip().lower()
+    return email if EMAIL_PATTERN.match(email) else ""
+
+
+def resume_url_hash(url):
+    return hashlib.sha256(str(url).strip().encode("utf-8")).hexdigest()
+
+
+class CandidateWriter:
+    """
+    Writes extracted candidates in batches: one multi-row INSERT into
+    private.candidates and one into the role table, committed together. If a batch
+    is rejected it is replayed row by row so only the offending candidates fail.
+    With `existing_emails` (append mode), candidates whose email is already in the
+    table are skipped (returned as None); without it nothing is deduplicated.
+    """
+
+    def __init__(self, connection, table_name, columns, existing_emails=None):
+        self.connection = connection
+        self.table_name = table_name
+        self.columns = columns
+        self.email_column = next(
+            (col for col in columns if col.lower() == "email"), None
+        )
+        self.existing_emails = existing_emails
+        self._lock = threading.Lock()
+
+    def _candidate_row(self, item):
+        row = item["row"]
+        return (str(uuid.uuid4()), row["name"], row["pdf_url"], item["resume_text"])
+
+    def _role_row(self, item):
+        values = []
+        for col in self.columns:
+            value = item["candidate_info"].get(col, "")
+            values.append("" if value is None else str(value))
+        values.append(item.get("resume_url_hash"))
+        return tuple(values)
+
+    def _email(self, item):
+        if not self.email_column:
+            return ""
+        return normalize_email(item["candidate_info"].get(self.email_column))
+
+    def _claim_emails(self, items):
+        """Returns the positions of items whose email is new, reserving those emails."""
+        if self.existing_emails is None:
+            return list(range(len(items)))
+        fresh = []
+        with self._lock:
+            for position, item in enumerate(items):
+                email = self._email(item)
+                if email and email in self.existing_emails:
+                    print(f"Candidate {item['index'] + 1} already present ({email}), skipping")
+                    continue
+                if email:
+                    self.existing_emails.add(email)
+                fresh.append(position)
+        return fresh
+
+    def _insert(self, cursor, items):
+        execute_values(
+            cursor,
+            "INSERT INTO private.candidates (id, name, resume_link, resume_text) VALUES %s",
+            [self._candidate_row(item) for item in items],
+            page_size=len(items),
+        )
+        insert_columns = ", ".join(
+            [f'"{col}"' for col in self.columns] + ["resume_url_hash"]
+        )
+        execute_values(
+            cursor,
+            f'INSERT INTO "{self.table_name}" ({insert_columns}) VALUES %s',
+            [self._role_row(item) for item in items],
+            page_size=len(items),
+        )
+
+    def write_batch(self, items):
+        results = [None] * len(items)
+        fresh = self._claim_emails(items)
+        if fresh:
+            for position, result in zip(fresh, self._write([items[i] for i in fresh])):
+                results[position] = result
+        return results
+
+    def _write(self, items):
+        cursor = self.connection.cursor()
+        try:
+            print(f"Debug: Inserting batch of {len(items)} candidates...")
+            self._insert(cursor, items)
+            self.connection.commit()
+            return list(items)
+        except Exception as batch_error:
+            self.connection.rollback()
+            print(f"Batch insert failed, retrying row by row: {batch_error}")
+        finally:
+            cursor.close()
+
+        results = []
+        for item in items:
+            cursor = self.connection.cursor()
+            try:
+                self._insert(cursor, [item])
+                self.connection.commit()
+                results.append(item)
+            except Exception as row_error:
+                self.connection.rollback()
+                if self.existing_emails is not None:
+                    with self._lock:
+                        self.existing_emails.discard(self._email(item))
+                results.append(row_error)
+            finally:
+                cursor.close()
+        return results
@@ -1,8 +1,7 @@
 from crewai import Agent, Task, Crew, Process
 from langchain_community.utilities import SQLDatabase
-from langchain_community.agent_toolkits.sql.base import create_sql_agent
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.globals import set_llm_cache
 from dotenv import load_dotenv
 import os
 import psycopg2
@@ -14,19 +13,88 @@ import tempfile
 import json
 from urllib.parse import urlparse, parse_qs
 import re
-import gdown
 import litellm
 import io
 import sys
 import uuid
+import time
 from datetime import datetime
 from composio_openai import ComposioToolSet
 from composio import App, Action
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from services.ingestion_pipeline import (
+    IngestionPipeline,
+    IngestionProgress,
+    PipelineStage,
+    INGEST_WORKERS,
+)
+from services.candidate_writer import (
+    CandidateWriter,
+    INGEST_INSERT_BATCH,
+    normalize_email,
+    resume_url_hash,
+)
+from services.resume_cache import resume_cache
+from services.resume_downloader import resume_downloader
+from services.prescreen import Prescreener
+from services.pdf_extractor import pdf_extractor, PDF_WORKERS
+from services.ingestion_checkpoint import ingestion_checkpoints
+from services.llm_gateway import llm_gateway
+from services.sql_agent_cache import SqlAgentCache
+from services.table_metadata import table_metadata
+from services.sql_query_cache import nl_sql_cache
+from services.agent_events import AgentEventHandler
+from services.rate_limiter import llm_rate_limiter, langchain_rate_limit_callback
+from services.llm_fixtures import llm_fixtures, langchain_fixture_cache
+from services.intent_classifier import intent_classifier
+from services.followup_service import followup_service
+from services.prompt_compactor import (
+    prompt_compactor,
+    count_tokens,
+    prompt_budget,
+    truncate_sections,
+)
+from services.metrics import CHAT_STAGE_SECONDS, CHAT_AGENT_ITERATIONS
 
 load_dotenv()
 
 TEMP_DIR = os.path.join(os.path.dirname(__file__), "..", "temp")
+INGEST_EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS", PDF_WORKERS or 2))
+# "single": one extraction call per resume, "batch": several resumes share one call,
+# "fused": one call per resume returning both the extracted fields and the score
+INGEST_EXTRACTION_MODE = os.getenv("INGEST_EXTRACTION_MODE", "single")
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", 8))
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", 60000))
+# threads used by process_query to overlap intent detection, rephrasing and agent setup
+QUERY_PREFETCH_WORKERS = int(os.getenv("QUERY_PREFETCH_WORKERS", 8))
+# a cached query is only answered from cache when its whole result fits this many
+# rows and the sql_rows prompt budget; larger results go through the agent
+SQL_CACHE_MAX_ROWS = int(os.getenv("SQL_CACHE_MAX_ROWS", 100))
+SQL_CACHE_STATEMENT_TIMEOUT_MS = int(os.getenv("SQL_CACHE_STATEMENT_TIMEOUT_MS", 10000))
+# the number after a "score" label, e.g. "Score: 78.5", "**Score:** 78" or "score (0-100): 78"
+SCORE_PATTERN = re.compile(
+    r"\bscore\s*(?:\([^)]*\))?\s*(?:is|of|:|=)?\s*\**\s*(\d+(?:\.\d+)?)", re.IGNORECASE
+)
+
+# answer layout shared by the SQL agent prompt and answers built from cached SQL
+SQL_ANSWER_FORMAT = """
+Please format the final answer like this:
+---
+**🔍 Result**
+The natural language response obtained from the data, here also include the reason/logic behind the answer being given, like mentioning the source or why a particular candidate is more apt etc, this would help the HR make decisions in a more informed manner since the proofs and logic etc can be verified from the data source as well.
+
+**📊 Data Overview**
+Table or bullet points showing the SQL result
+
+**Conclusion**
+A final conclusion of the query
+---
+
+IMPORTANT GUIDELINES  :
+    a. Only include sections that make sense for the result. Be brief but informative.
+    b. The user using this application is an HR so make sure not to use technical terms in the response, keep it easy flowing and understandable.
+"""
 
 if not os.path.exists(TEMP_DIR):
     os.makedirs(TEMP_DIR)
@@ -43,14 +111,10 @@ class LiteLLMAgent(Agent):
     def execute_task(self, task, context=None, tools=None):
         try:
             print(f"Executing task: {task.description}")
-            response = litellm.completion(
-                model="gemini/gemini-2.0-flash",
-                messages=[{"role": "user", "content": task.description}],
-                api_key=os.getenv("GOOGLE_API_KEY"),
-            )
+            response = llm_gateway.complete(task.description, call_site="crew_agent")
             print(f"LiteLLM Response: {response}")
 
-            output_content = response.choices[0].message.content
+            output_content = response
             print(f"Output content: {output_content}")
             return output_content
         except Exception as e:
@@ -58,20 +122,33 @@ class LiteLLMAgent(Agent):
             return f"Error: {e}"
 
 
+def _ignore_event(event, data):
+    pass
+
+
 class ChatService:
     def __init__(self):
         self.data_processor = ChatGoogleGenerativeAI(
             model="gemini-2.0-flash",
             google_api_key=os.getenv("GOOGLE_API_KEY"),
             temperature=0,
+            # the langchain cache only sees non-streamed calls
+            disable_streaming=llm_fixtures.enabled,
+            # agent turns share the gateway's rate limits
+            callbacks=[langchain_rate_limit_callback(llm_rate_limiter)],
         )
+        if llm_fixtures.enabled:
+            # the SQL agent's tool-calling turns go through langchain, not the gateway
+            set_llm_cache(langchain_fixture_cache(llm_fixtures))
 
         self.connection_string = os.getenv("CONNECTION_URL")
+        self.sql_agents = SqlAgentCache(self.connection_string, self.data_processor)
+        self._query_executor = ThreadPoolExecutor(max_workers=QUERY_PREFETCH_WORKERS)
         self._init_db()
 
     def _init_db(self):
         try:
-            db = SQLDatabase.from_uri(self.connection_string)
+            db = SQLDatabase(self.sql_agents.engine)
             print(db)
             # Use invoke instead of run (deprecated method)
             db.run_no_throw(
@@ -101,7 +178,7 @@ class ChatService:
         except Exception as e:
             raise Exception(f"Error creating database connection: {str(e)}")
 
-    def rephrase_with_chat_context(self, query, user_id, table_name, connection):
+    def _get_chat_history(self, user_id, table_name, connection):
         cursor = connection.cursor()
 
         # Fetch last 10 messages for context
@@ -117,12 +194,19 @@ class ChatService:
 
         history = cursor.fetchall()
         cursor.close()
+        return history
+
+    def rephrase_with_chat_context(
+        self, query, user_id, table_name, connection, history=None
+    ):
+        if history is None:
+            history = self._get_chat_history(user_id, table_name, connection)
 
         if not history:
             return query  # No context, return as-is
 
         # Build chat history string
-        chat_context = "\n".join([f"User: {q}\nBot: {r}" for q, r in reversed(history)])
+        chat_context = prompt_compactor.compact_history(reversed(history))
 
         prompt = f"""
         You are an AI assistant helping with SQL-related questions based on previous conversation history.
@@ -143,13 +227,9 @@ class ChatService:
         """
 
         # Call LLM to rephrase
-        response = litellm.completion(
-            model="gemini/gemini-2.0-flash",
-            messages=[{"role": "user", "content": prompt}],
-            api_key=os.getenv("GOOGLE_API_KEY"),
-        )
+        response = llm_gateway.complete(prompt, call_site="rephrase")
 
-        rephrased_question = response.choices[0].message.content.strip()
+        rephrased_question = response.strip()
 
         print("till here 2 - ", rephrased_question)
 
@@ -158,13 +238,17 @@ class ChatService:
         return rephrased_question
 
     def detect_intent(self, question: str) -> str:
+        intent = intent_classifier.classify(question)
+        if intent:
+            return intent
+
         intent_prompt = f"""
             You are an intent classifier for an HR assistant.
 
             Classify the intent of the following user question into one of:
             - "sql": if the question relates to querying a candidate database.
             - "bestfit": if the question relates to the showing proofs/reasons/source of why the candidate is a perfect fit (samples might include question like - why do you think the candidate mansi is a good fit?)
-            - "gmail": if it involves sending, replying to, or checking emails.
+            - "gmail": if it involves sending, replying to, or checking emails. Asking for a candidate's email address is "sql", not "gmail".
             - "calendar": if it involves scheduling or managing meetings on a calendar.
             - "unknown": if the intent is unclear or unsupported.
 
@@ -172,30 +256,23 @@ class ChatService:
 
             Respond with only one word: "sql","bestfit", "gmail", "calendar", or "unknown".
             """
-        response = litellm.completion(
-            model="gemini/gemini-2.0-flash",
-            messages=[{"role": "user", "content": intent_prompt}],
-            api_key=os.getenv("GOOGLE_API_KEY"),
-        )
+        response = llm_gateway.complete(intent_prompt, call_site="intent")
 
-        return response.choices[0].message.content.strip().lower()
+        intent = response.strip().lower().strip('"')
+        intent_classifier.learn(question, intent)
+        return intent
 
-    def process_query(self, table_name, query, user_id):
+    def process_query(self, table_name, query, user_id, emit=None):
+        """
+        Answers `query` against `table_name`. `emit(event, data)`, if given, receives
+        stage events ("rephrased", "intent", "sql-executed") and answer tokens.
+        """
+        emit = emit or _ignore_event
         try:
-            # Create SQL agent with proper configuration
-            db = SQLDatabase.from_uri(
-                self.connection_string, include_tables=[table_name]
-            )
-
-            # Create SQL toolkit and agent
-            toolkit = SQLDatabaseToolkit(db=db, llm=self.data_processor)
-            agent = create_sql_agent(
-                llm=self.data_processor,
-                toolkit=toolkit,
-                verbose=True,
-                agent_type="openai-tools",
-                handle_parsing_errors=True,
-            )
+            # Fetch (or build and cache) the table's SQL agent and classify the raw
+            # query while the chat history is fetched and, if needed, the query rephrased
+            agent_future = self._query_executor.submit(self.sql_agents.get, table_name)
+            intent_future = self._query_executor.submit(self.detect_intent, query)
 
             # First, get the table schema to provide context
             connection = self._get_db_connection()
@@ -203,8 +280,13 @@ class ChatService:
 
             # create a rephraser layer which will access the past 10 chat history in the thread and then create a contextually aware chat interface
             # Add this before enhanced_query is constructed
+            stage_started = time.perf_counter()
+            history = self._get_chat_history(user_id, table_name, connection)
             rephrased_query = self.rephrase_with_chat_context(
-                query, user_id, table_name, connection
+                query, user_id, table_name, connection, history=history
+            )
+            CHAT_STAGE_SECONDS.observe(
+                time.perf_counter() - stage_started, stage="rephrase"
             )
 
             print(
@@ -215,9 +297,18 @@ class ChatService:
                 "------------------------STAGE 0 QUERY REPHRASER------------------------"
             )
             print()
+            emit("rephrased", {"query": rephrased_query})
 
             # now checking the intent of the query to route it appropritely to the user
-            intent = self.detect_intent(rephrased_query)
+            # the speculative intent is only valid if rephrasing left the query unchanged
+            stage_started = time.perf_counter()
+            if rephrased_query.strip() == query.strip():
+                intent = intent_future.result()
+            else:
+                intent = self.detect_intent(rephrased_query)
+            CHAT_STAGE_SECONDS.observe(
+                time.perf_counter() - stage_started, stage="intent"
+            )
             print(
                 "------------------------STAGE 1 INTENT DETECTOR------------------------"
             )
@@ -225,6 +316,7 @@ class ChatService:
             print(
                 "------------------------STAGE 1 INTENT DETECTOR------------------------"
             )
+            emit("intent", {"intent": intent})
 
             if intent == "gmail":
                 return self.send_mail_to_candidates(rephrased_query)
@@ -233,24 +325,17 @@ class ChatService:
             elif intent == "calendar":
                 return self.create_calendar_event(rephrased_query)
             elif intent == "sql":
+                message_id = str(uuid.uuid4())
                 try:
-                    cursor.execute(
-                        f"""
-                        SELECT column_name, data_type 
-                        FROM information_schema.columns 
-                        WHERE table_name = '{table_name}' 
-                        AND table_schema = 'public'
-                        ORDER BY ordinal_position
-                    """
-                    )
-                    schema = cursor.fetchall()
+                    stage_started = time.perf_counter()
+                    metadata = table_metadata.get(table_name, connection)
 
-                    if not schema:
+                    if not metadata:
                         return f"Table '{table_name}' not found or has no accessible columns."
-
-                    # Get sample data to understand the table better
-                    cursor.execute(f'SELECT * FROM "{table_name}" LIMIT 3')
-                    sample_data = cursor.fetchall()
+                    schema = metadata["columns"]
+                    CHAT_STAGE_SECONDS.observe(
+                        time.perf_counter() - stage_started, stage="schema_fetch"
+                    )
 
                     # Build enhanced prompt with context
                     schema_info = "\n".join(
@@ -273,75 +358,50 @@ class ChatService:
                         - Add brief **interpretation/explanation** of the data in simple terms.
                     3. If the question involves candidate availability, communication status, or next steps, **answer conversationally** like an assistant helping an HR person.                    
 
-                    Please format the final answer like this:
-                    ---
-                    **🔍 Result**
-                    The natural language response obtained from the data, here also include the reason/logic behind the answer being given, like mentioning the source or why a particular candidate is more apt etc, this would help the HR make decisions in a more informed manner since the proofs and logic etc can be verified from the data source as well.
-
-                    **📊 Data Overview**
-                    Table or bullet points showing the SQL result
-
-                    **Conclusion**
-                    A final conclusion of the query
-                    ---
-
-                    IMPORTANT GUIDELINES  :
-                        a. Only include sections that make sense for the result. Be brief but informative.
-                        b. The user using this application is an HR so make sure not to use technical terms in the response, keep it easy flowing and understandable.
+                    {SQL_ANSWER_FORMAT}
                     """
 
-                    # Use invoke instead of run
-                    result = agent.invoke({"input": enhanced_query})
-
-                    # print("here was the llm response - ", result["output"])
-
-                    # Extract the output from the result
-                    if isinstance(result, dict):
-                        final_resp = result.get("output", str(result))
-                    else:
-                        final_resp = str(result)
-
-                    followup_prompt = f"""
-                        You are an AI assistant helping HR professionals analyze candidate data.
-
-                        Given the following user question and the AI-generated answer (based on SQL results), generate a list of 3 most relevant and logical follow-up questions.
-
-                        Guidelines:
-                        - The follow-up questions must be **resolvable using SQL queries** on the same table.
-                        - They should be **related** to the user's original question and **extend the conversation meaningfully**.
-                        - Avoid vague or generic questions.
-                        - The questions should help the HR make informed decisions or take actions.
-                        - Do NOT repeat the original question or restate its answer.
-
-                        Return ONLY a JSON list of 3 strings in the following format - 
-                        
+                    sql_cache_key = nl_sql_cache.key(
+                        rephrased_query, table_name, metadata["version"]
+                    )
+                    final_resp = self._answer_from_cached_sql(
+                        sql_cache_key, rephrased_query, table_name, connection, emit
+                    )
+                    if final_resp is None:
+                        # Use invoke instead of run
+                        stage_started = time.perf_counter()
+                        agent = agent_future.result()
+                        agent_events = AgentEventHandler(emit)
+                        result = agent.invoke(
+                            {"input": enhanced_query},
+                            config={"callbacks": [agent_events]},
+                        )
+                        CHAT_STAGE_SECONDS.observe(
+                            time.perf_counter() - stage_started, stage="agent"
+                        )
+                        CHAT_AGENT_ITERATIONS.observe(agent_events.iterations)
 
-                        Original Question:
-                        {rephrased_query}
+                        # print("here was the llm response - ", result["output"])
 
-                        LLM Answer:
-                        {final_resp}
+                        # Extract the output from the result
+                        if isinstance(result, dict):
+                            final_resp = result.get("output", str(result))
+                        else:
+                            final_resp = str(result)
 
-                        Your output:
-                    """
+                        # remember the SQL that answered this question for next time
+                        if agent_events.cacheable_sql:
+                            nl_sql_cache.put(sql_cache_key, agent_events.cacheable_sql)
 
-                    followup_response = litellm.completion(
-                        model="gemini/gemini-2.0-flash",
-                        messages=[{"role": "user", "content": followup_prompt}],
-                        api_key=os.getenv("GOOGLE_API_KEY"),
+                    followup_service.submit(
+                        message_id,
+                        lambda: self._generate_followups(rephrased_query, final_resp),
                     )
-
-                    followups = followup_response.choices[0].message.content.strip()
-                    followups = (
-                        followups.replace("```json", "").replace("```", "").strip()
-                    )
-                    return {
-                        "response": final_resp,
-                        "followups": ast.literal_eval(followups),
-                    }
+                    return {"response": final_resp, "message_id": message_id}
 
                 finally:
                     # first checking if a thread id already exists
+                    stage_started = time.perf_counter()
                     cursor.execute(
                         f"""
                         SELECT thread_id
@@ -366,7 +426,7 @@ class ChatService:
                         final_resp,
                         thread_id,
                         current_timestamp,
-                        str(uuid.uuid4()),
+                        message_id,
                     ]
 
                     print(values)
@@ -374,6 +434,9 @@ class ChatService:
                     print(f"Debug: Inserting conversation data...")
                     cursor.execute(insert_sql, values)
                     connection.commit()
+                    CHAT_STAGE_SECONDS.observe(
+                        time.perf_counter() - stage_started, stage="history_write"
+                    )
                     cursor.close()
                     connection.close()
             else:
@@ -386,6 +449,105 @@ class ChatService:
             except Exception as fallback_error:
                 return f"Error processing query: {str(e)}\nFallback error: {str(fallback_error)}"
 
+    def _answer_from_cached_sql(self, cache_key, question, table_name, connection, emit):
+        """
+        Answers `question` by running the SQL cached for it and having the LLM
+        only format the rows. Returns None on a cache miss, or if the cached SQL
+        no longer runs or its result does not fit the prompt whole; in those
+        cases the entry is dropped.
+        """
+        sql = nl_sql_cache.get(cache_key)
+        if not sql:
+            return None
+
+        stage_started = time.perf_counter()
+        cursor = connection.cursor()
+        try:
+            # end the open read transaction so this one can be made read-only
+            connection.rollback()
+            cursor.execute("SET TRANSACTION READ ONLY")
+            cursor.execute(f"SET LOCAL statement_timeout = {SQL_CACHE_STATEMENT_TIMEOUT_MS}")
+            cursor.execute(sql)
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchmany(SQL_CACHE_MAX_ROWS + 1)
+        except Exception as e:
+            print(f"Cached SQL failed, falling back to the agent: {e}")
+            nl_sql_cache.discard(cache_key)
+            return None
+        finally:
+            cursor.close()
+            connection.rollback()
+        CHAT_STAGE_SECONDS.observe(time.perf_counter() - stage_started, stage="cached_sql")
+
+        # never hand the LLM a cut-down result: counts and lists must match the agent's
+        rows_data = json.dumps(
+            [dict(zip(columns, row)) for row in rows], separators=(",", ":"), default=str
+        )
+        if len(rows) > SQL_CACHE_MAX_ROWS or count_tokens(rows_data) > prompt_budget(
+            "sql_rows"
+        ):
+            print("Cached SQL result too large for the prompt, using the agent instead")
+            nl_sql_cache.discard(cache_key)
+            return None
+        emit("sql-executed", {"query": sql, "cached": True})
+        prompt = f"""
+        You are a helpful AI assistant designed to support HR professionals by answering questions about candidate data from the database.
+
+        User question: "{question}"
+
+        This SQL query was run against the table '{table_name}' to answer it:
+        {sql}
+
+        It returned {len(rows)} rows, all of them shown here as JSON:
+        {rows_data}
+
+        Answer the question from these rows only, in a professional, clear, and human-readable format.
+        {SQL_ANSWER_FORMAT}
+        """
+
+        stage_started = time.perf_counter()
+        chunks = []
+        for text in llm_gateway.stream(prompt, call_site="cached_sql_answer"):
+            chunks.append(text)
+            emit("token", {"text": text})
+        CHAT_STAGE_SECONDS.observe(time.perf_counter() - stage_started, stage="answer")
+        return "".join(chunks)
+
+    def _generate_followups(self, question, answer):
+        answer = prompt_compactor.compact(answer, "answer")
+        followup_prompt = f"""
+            You are an AI assistant helping HR professionals analyze candidate data.
+
+            Given the following user question and the AI-generated answer (based on SQL results), generate a list of 3 most relevant and logical follow-up questions.
+
+            Guidelines:
+            - The follow-up questions must be **resolvable using SQL queries** on the same table.
+            - They should be **related** to the user's original question and **extend the conversation meaningfully**.
+            - Avoid vague or generic questions.
+            - The questions should help the HR make informed decisions or take actions.
+            - Do NOT repeat the original question or restate its answer.
+
+            Return ONLY a JSON list of 3 strings in the following format - 
+            
+
+            Original Question:
+            {question}
+
+            LLM Answer:
+            {answer}
+
+            Your output:
+        """
+
+        with CHAT_STAGE_SECONDS.time(stage="followups"):
+            followup_response = llm_gateway.complete(
+                followup_prompt, call_site="followups"
+            )
+
+        followups = followup_response.strip()
+        followups = followups.replace("```json", "").replace("```", "").strip()
+        return ast.literal_eval(followups)
+
     def _execute_direct_query(self, table_name, query):
         """Fallback method to execute queries directly"""
         try:
@@ -393,19 +555,11 @@ class ChatService:
             cursor = connection.cursor()
 
             # Get table schema
-            cursor.execute(
-                f"""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = '{table_name}' 
-                AND table_schema = 'public'
-                ORDER BY ordinal_position
-            """
-            )
-            schema = cursor.fetchall()
+            metadata = table_metadata.get(table_name, connection)
 
-            if not schema:
+            if not metadata:
                 return f"Table '{table_name}' not found."
+            schema = metadata["columns"]
 
             schema_info = "\n".join([f"- {col[0]} ({col[1]})" for col in schema])
 
@@ -422,13 +576,9 @@ class ChatService:
             Return ONLY the SQL query, no explanations or formatting.
             """
 
-            response = litellm.completion(
-                model="gemini/gemini-2.0-flash",
-                messages=[{"role": "user", "content": prompt}],
-                api_key=os.getenv("GOOGLE_API_KEY"),
-            )
+            response = llm_gateway.complete(prompt, call_site="direct_sql")
 
-            sql_query = response.choices[0].message.content.strip()
+            sql_query = response.strip()
 
             # Clean up the SQL query
             sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
@@ -456,19 +606,17 @@ class ChatService:
             
             Query: {query}
             SQL executed: {sql_query}
-            Results: {formatted_results[:5]}  # Show first 5 results
+            Results (first rows only): {prompt_compactor.compact_json(formatted_results[:5], "sql_rows")}
             Total rows: {len(results)}
             
             Provide a clear, concise explanation of what the results show.
             """
 
-            explanation_response = litellm.completion(
-                model="gemini/gemini-2.0-flash",
-                messages=[{"role": "user", "content": explanation_prompt}],
-                api_key=os.getenv("GOOGLE_API_KEY"),
+            explanation_response = llm_gateway.complete(
+                explanation_prompt, call_site="direct_sql_explanation"
             )
 
-            explanation = explanation_response.choices[0].message.content
+            explanation = explanation_response
 
             cursor.close()
             connection.close()
@@ -482,51 +630,30 @@ class ChatService:
                 connection.close()
             raise Exception(f"Error in direct query execution: {str(e)}")
 
-    def process_new_chat(self, df, jd_text, table_name):
-        try:
-            print("Step 1: Analyzing job description to determine required columns...")
-            columns_response = litellm.completion(
-                model="gemini/gemini-2.0-flash",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f'Analyze this job description and determine what columns should be in a candidates database table. Return ONLY a JSON array of column names that would be useful for storing candidate information relevant to this job. Include standard fields like name, email, phone, skills, experience, education, etc. Example format: ["name", "email", "phone", "skills", "experience", "education", "linkedin"].\n\nJob Description:\n{jd_text}',
-                    }
-                ],
-                api_key=os.getenv("GOOGLE_API_KEY"),
-            )
-
-            columns_content = columns_response.choices[0].message.content.strip()
-            print(f"Debug: Raw columns response: {columns_content}")
+    def process_new_chat(
+        self,
+        candidates,
+        jd_text,
+        table_name,
+        workers=None,
+        progress=None,
+        mode="replace",
+        run_id=None,
+    ):
+        """
+        Ingests `candidates` into the role table `table_name`. `candidates` is a
+        DataFrame or any iterable of `(index, row)` pairs such as a CandidateCsvReader.
 
-            if columns_content.startswith("```json"):
-                columns_content = columns_content[len("```json") :].lstrip()
-            if columns_content.endswith("```"):
-                columns_content = columns_content[: -len("```")].rstrip()
+        mode="replace" rebuilds the table from scratch. mode="append" keeps an existing
+        table and its columns and only processes candidates whose resume URL or email
+        is not already in it; the stored JD is used when `jd_text` is empty, and a
+        newly uploaded JD replaces the stored one and scores the appended candidates.
+        Rows already in the table keep the scores computed against the old JD.
 
-            try:
-                columns = json.loads(columns_content)
-                if not isinstance(columns, list) or not columns:
-                    raise ValueError("Expected non-empty list")
-            except (json.JSONDecodeError, ValueError) as e:
-                print(f"Failed to parse columns JSON, using default: {e}")
-
-                columns = [
-                    "name",
-                    "email",
-                    "phone",
-                    "skills",
-                    "experience",
-                    "education",
-                    "linkedin",
-                ]
-
-            print(f"Debug: Extracted columns: {columns}")
-
-            if "score" not in [col.lower() for col in columns]:
-                columns.append("score")
-
-            print(f"Step 2: Creating table {table_name} with columns: {columns}")
+        With a `run_id` every candidate's progress is checkpointed; calling again with
+        the id of an unfinished run resumes it instead of rebuilding the table.
+        """
+        try:
             connection = self._get_db_connection()
 
             try:
@@ -544,113 +671,426 @@ class ChatService:
                 """
                 )
 
-                cursor.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+                columns = None
+                resume_states = None
+                if run_id:
+                    run = ingestion_checkpoints.get_run(run_id)
+                    if run and run["status"] == "running":
+                        columns = self._get_role_table_columns(cursor, table_name)
+                        if columns:
+                            resume_states = ingestion_checkpoints.load_candidates(run_id)
+                            print(
+                                f"Resuming run {run_id}: {len(resume_states)} candidates checkpointed"
+                            )
 
-                create_table_columns = ", ".join([f'"{col}" TEXT' for col in columns])
-                create_table_sql = f"""
-                    CREATE TABLE "{table_name}" (
-                        id SERIAL PRIMARY KEY,
-                        {create_table_columns},
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                if mode == "append" and columns is None:
+                    columns = self._get_role_table_columns(cursor, table_name)
+                    if columns is None:
+                        print(f"Table {table_name} does not exist yet, creating it")
+
+                if columns:
+                    print(f"Step 1: Appending to {table_name} with columns: {columns}")
+                    cursor.execute(
+                        f'ALTER TABLE "{table_name}" ADD COLUMN IF NOT EXISTS resume_url_hash TEXT'
+                    )
+                    stored_jd = self._get_stored_job_description(cursor, table_name)
+                    if not jd_text and not stored_jd:
+                        raise Exception(f"No job description stored for {table_name}")
+                    if jd_text and jd_text != stored_jd:
+                        self._save_job_description(cursor, table_name, jd_text)
+                    jd_text = jd_text or stored_jd
+                    existing = self._get_existing_candidate_keys(
+                        cursor, table_name, columns
+                    )
+                    connection.commit()
+                    self._invalidate_table_caches(table_name)
+                else:
+                    if not jd_text:
+                        raise Exception("A job description is required to create a table")
+                    print(
+                        "Step 1: Analyzing job description to determine required columns..."
+                    )
+                    columns = self._determine_columns(jd_text)
+                    print(f"Step 2: Creating table {table_name} with columns: {columns}")
+                    self._create_role_table(cursor, table_name, columns, jd_text)
+                    connection.commit()
+                    self._invalidate_table_caches(table_name)
+                    # checkpoints of other runs describe rows the rebuild just dropped
+                    ingestion_checkpoints.supersede_runs(table_name, except_run_id=run_id)
+                    print(f"Table {table_name} created successfully")
+                    existing = {"emails": set(), "url_hashes": set()}
+
+                checkpoint = None
+                if run_id:
+                    checkpoint = ingestion_checkpoints.start_run(
+                        run_id, table_name, resume=resume_states is not None
                     )
-                """
-                print(f"Debug: CREATE TABLE SQL: {create_table_sql}")
-                cursor.execute(create_table_sql)
-                current_timestamp = datetime.now()
-                cursor.execute(
-                    "INSERT INTO private.jobDesc (id,table_name, jd_content,created_at) VALUES (%s,%s,%s, %s)",
-                    (1, table_name, jd_text, current_timestamp),
-                )
-                connection.commit()
-                print(f"Table {table_name} created successfully")
 
                 print("Step 3: Processing candidates...")
-                processed_count = 0
-
-                for index, row in df.iterrows():
-                    try:
-                        print(f"Processing candidate {index + 1}/{len(df)}")
-
-                        resume_text = self._download_and_extract_resume(row["pdf_url"])
-                        print(
-                            f"Resume text extracted, length: {len(resume_text)} characters"
-                        )
-
-                        # saving the resume text for all the candidate
-                        insert_columns = "id, name, resume_link, resume_text"
-                        placeholders = ", ".join(["%s"] * 4)
-                        insert_sql = f"INSERT INTO private.candidates ({insert_columns}) VALUES ({placeholders})"
-
-                        values = [
-                            str(uuid.uuid4()),
-                            row["name"],
-                            row["pdf_url"],
-                            resume_text,
-                        ]
-
-                        print(values)
-
-                        print(f"Debug: Inserting candidates data...")
-                        cursor.execute(insert_sql, values)
-                        connection.commit()
-                        cursor.close()
-                        connection.close()
-
-                        print("Extracting candidate information...")
-                        candidate_info = self._extract_candidate_info_for_jd(
-                            resume_text, jd_text, columns
-                        )
-                        print(
-                            f"Candidate info extracted: {list(candidate_info.keys())}"
-                        )
+                cursor.close()
+                stats = self._run_ingestion_pipeline(
+                    candidates,
+                    jd_text,
+                    table_name,
+                    columns,
+                    connection,
+                    workers,
+                    progress,
+                    existing,
+                    checkpoint,
+                    resume_states or {},
+                    dedupe_emails=mode == "append",
+                )
+                processed_count = stats["processed"]
+                if run_id:
+                    ingestion_checkpoints.finish_run(run_id, stats)
 
-                        print("Calculating match score...")
-                        score = self._calculate_score(candidate_info, jd_text)
-                        candidate_info["score"] = str(score)
-                        print(f"Match score: {score}")
-
-                        insert_columns = ", ".join([f'"{col}"' for col in columns])
-                        placeholders = ", ".join(["%s"] * len(columns))
-                        insert_sql = f'INSERT INTO "{table_name}" ({insert_columns}) VALUES ({placeholders})'
-
-                        values = []
-                        for col in columns:
-                            value = candidate_info.get(col, "")
-                            if value is None:
-                                values.append("")
-                            else:
-                                values.append(str(value))
-
-                        print(f"Debug: Inserting candidate data...")
-                        cursor.execute(insert_sql, values)
-                        connection.commit()
-                        processed_count += 1
-                        print(f"Candidate {index + 1} processed successfully")
-
-                    except Exception as candidate_error:
-                        print(
-                            f"Error processing candidate {index + 1}: {candidate_error}"
-                        )
-                        continue
+                # warm the metadata for the first chat message
+                try:
+                    table_metadata.refresh(table_name, connection)
+                except Exception as e:
+                    print(f"Could not refresh metadata for {table_name}: {e}")
 
                 print(
-                    f"Processing completed. {processed_count} candidates processed successfully."
+                    f"Processing completed. {processed_count} candidates processed successfully, {stats['skipped']} already present."
                 )
 
             except Exception as e:
                 connection.rollback()
                 raise Exception(f"Database operation failed: {e}")
             finally:
-                cursor.close()
+                if not cursor.closed:
+                    cursor.close()
                 connection.close()
 
             return {
-                "message": f"Processing completed successfully. {processed_count} candidates processed."
+                "message": f"Processing completed successfully. {processed_count} candidates processed.",
+                "processed": processed_count,
+                "skipped": stats["skipped"],
+                "failed": stats["failed"],
             }
 
         except Exception as e:
             raise Exception(f"Error processing new chat: {str(e)}")
 
+    def _invalidate_table_caches(self, table_name):
+        """Drops everything cached about `table_name`'s schema after DDL on it."""
+        self.sql_agents.invalidate(table_name)
+        table_metadata.invalidate(table_name)
+
+    def _determine_columns(self, jd_text):
+        jd_text = prompt_compactor.compact(jd_text, "jd", summarize=True)
+        columns_response = llm_gateway.complete(
+            f'Analyze this job description and determine what columns should be in a candidates database table. Return ONLY a JSON array of column names that would be useful for storing candidate information relevant to this job. Include standard fields like name, email, phone, skills, experience, education, etc. Example format: ["name", "email", "phone", "skills", "experience", "education", "linkedin"].\n\nJob Description:\n{jd_text}',
+            call_site="columns",
+        )
+
+        columns_content = columns_response.strip()
+        print(f"Debug: Raw columns response: {columns_content}")
+
+        if columns_content.startswith("```json"):
+            columns_content = columns_content[len("```json") :].lstrip()
+        if columns_content.endswith("```"):
+            columns_content = columns_content[: -len("```")].rstrip()
+
+        try:
+            columns = json.loads(columns_content)
+            if not isinstance(columns, list) or not columns:
+                raise ValueError("Expected non-empty list")
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"Failed to parse columns JSON, using default: {e}")
+
+            columns = [
+                "name",
+                "email",
+                "phone",
+                "skills",
+                "experience",
+                "education",
+                "linkedin",
+            ]
+
+        print(f"Debug: Extracted columns: {columns}")
+
+        if "score" not in [col.lower() for col in columns]:
+            columns.append("score")
+        return columns
+
+    def _create_role_table(self, cursor, table_name, columns, jd_text):
+        cursor.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+
+        create_table_columns = ", ".join([f'"{col}" TEXT' for col in columns])
+        create_table_sql = f"""
+            CREATE TABLE "{table_name}" (
+                id SERIAL PRIMARY KEY,
+                {create_table_columns},
+                resume_url_hash TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+        print(f"Debug: CREATE TABLE SQL: {create_table_sql}")
+        cursor.execute(create_table_sql)
+        self._save_job_description(cursor, table_name, jd_text)
+
+    def _save_job_description(self, cursor, table_name, jd_text):
+        """Replaces the table's JD; every table keeps exactly one jobDesc row."""
+        cursor.execute(
+            "DELETE FROM private.jobDesc WHERE table_name = %s", (table_name,)
+        )
+        cursor.execute(
+            "INSERT INTO private.jobDesc (table_name, jd_content, created_at) VALUES (%s, %s, %s)",
+            (table_name, jd_text, datetime.now()),
+        )
+
+    def _get_stored_job_description(self, cursor, table_name):
+        cursor.execute(
+            """
+            SELECT jd_content
+            FROM private.jobDesc
+            WHERE table_name = %s
+            ORDER BY created_at DESC
+            LIMIT 1
+            """,
+            (table_name,),
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _get_role_table_columns(self, cursor, table_name):
+        """Returns the candidate columns of an existing role table (score last), or None."""
+        cursor.execute(
+            """
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+            AND table_name = %s
+            ORDER BY ordinal_position
+            """,
+            (table_name,),
+        )
+        names = [row[0] for row in cursor.fetchall()]
+        if not names:
+            return None
+        columns = [
+            name
+            for name in names
+            if name not in ("id", "created_at", "resume_url_hash")
+            and name.lower() != "score"
+        ]
+        return columns + [next((n for n in names if n.lower() == "score"), "score")]
+
+    def _get_existing_candidate_keys(self, cursor, table_name, columns):
+        cursor.execute(
+            f'SELECT resume_url_hash FROM "{table_name}" WHERE resume_url_hash IS NOT NULL'
+        )
+        url_hashes = {row[0] for row in cursor.fetchall()}
+
+        emails = set()
+        email_column = next((col for col in columns if col.lower() == "email"), None)
+        if email_column:
+            cursor.execute(f'SELECT "{email_column}" FROM "{table_name}"')
+            emails = {
+                normalize_email(row[0]) for row in cursor.fetchall() if row[0]
+            } - {""}
+        return {"emails": emails, "url_hashes": url_hashes}
+
+    def _run_ingestion_pipeline(
+        self,
+        candidates,
+        jd_text,
+        table_name,
+        columns,
+        connection,
+        workers=None,
+        progress=None,
+        existing=None,
+        checkpoint=None,
+        resume_states=None,
+        dedupe_emails=False,
+    ):
+        workers = workers or INGEST_WORKERS
+        resume_states = resume_states or {}
+        if progress is None:
+            progress = IngestionProgress(
+                len(candidates) if hasattr(candidates, "__len__") else None
+            )
+        existing = existing or {"emails": set(), "url_hashes": set()}
+        if hasattr(candidates, "iterrows"):
+            candidates = candidates.iterrows()
+
+        def rows():
+            for index, row in candidates:
+                url_hash = resume_url_hash(row["pdf_url"])
+                candidate_key = f"{index}:{url_hash}"
+                state = resume_states.get(candidate_key, {})
+                if state.get("state") == "inserted":
+                    progress.item_skipped()
+                    continue
+                csv_email = (
+                    normalize_email(row["email"]) if dedupe_emails and "email" in row else ""
+                )
+                if url_hash in existing["url_hashes"] or (
+                    csv_email and csv_email in existing["emails"]
+                ):
+                    print(f"Candidate {index + 1} already present, skipping")
+                    progress.item_skipped()
+                    continue
+                existing["url_hashes"].add(url_hash)
+                item = {
+                    "index": index,
+                    "row": row,
+                    "resume_url_hash": url_hash,
+                    "candidate_key": candidate_key,
+                }
+                if state.get("candidate_info"):
+                    # scored before the restart, only the insert is left
+                    item["candidate_info"] = state["candidate_info"]
+                yield item
+
+        def checkpoint_item(item, state, **fields):
+            if checkpoint:
+                checkpoint.mark(item["candidate_key"], state, **fields)
+
+        def download(item):
+            print(f"Processing candidate {item['index'] + 1}/{progress.total}")
+            item.update(self._fetch_resume(item["row"]["pdf_url"]))
+            if "candidate_info" not in item:
+                checkpoint_item(item, "downloaded", content_hash=item["content_hash"])
+            return item
+
+        def extract(item):
+            item["resume_text"] = self._resume_text(item)
+            print(
+                f"Resume text extracted, length: {len(item['resume_text'])} characters"
+            )
+            if "candidate_info" not in item:
+                checkpoint_item(item, "extracted")
+            return item
+
+        prescreener = Prescreener(jd_text)
+
+        def prescreen(item):
+            if "candidate_info" in item:
+                return item
+            cheap_score = prescreener.score(item["resume_text"])
+            if not prescreener.passes(cheap_score):
+                print(
+                    f"Candidate {item['index'] + 1} below pre-screen threshold ({cheap_score}), skipping LLM"
+                )
+                candidate_info = {col: "" for col in columns}
+                if "name" in candidate_info:
+                    candidate_info["name"] = str(item["row"]["name"])
+                candidate_info["score"] = str(cheap_score)
+                item["candidate_info"] = candidate_info
+                checkpoint_item(item, "scored", candidate_info=candidate_info)
+            return item
+
+        def score(item):
+            if "candidate_info" in item:
+                return item
+            print("Extracting candidate information...")
+            candidate_info = self._extract_candidate_info_for_jd(
+                item["resume_text"], jd_text, columns
+            )
+            print(f"Candidate info extracted: {list(candidate_info.keys())}")
+            item = self._score_candidate(item, candidate_info, jd_text)
+            checkpoint_item(item, "scored", candidate_info=item["candidate_info"])
+            return item
+
+        def score_batch(items):
+            pending = [item for item in items if "candidate_info" not in item]
+            print(f"Extracting candidate information for {len(pending)} candidates...")
+            infos = self._extract_candidates_info_for_jd_batch(
+                [item["resume_text"] for item in pending], jd_text, columns
+            )
+            extracted = {id(item): info for item, info in zip(pending, infos)}
+            results = []
+            for item in items:
+                if id(item) not in extracted:
+                    results.append(item)
+                    continue
+                candidate_info = extracted[id(item)]
+                try:
+                    if isinstance(candidate_info, Exception):
+                        raise candidate_info
+                    item = self._score_candidate(item, candidate_info, jd_text)
+                    checkpoint_item(item, "scored", candidate_info=item["candidate_info"])
+                    results.append(item)
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        def score_fused(item):
+            if "candidate_info" in item:
+                return item
+            print("Extracting and scoring candidate...")
+            item["candidate_info"] = self._extract_and_score_candidate(
+                item["resume_text"], jd_text, columns
+            )
+            print(f"Match score: {item['candidate_info']['score']}")
+            checkpoint_item(item, "scored", candidate_info=item["candidate_info"])
+            return item
+
+        if INGEST_EXTRACTION_MODE == "batch":
+            score_stage = PipelineStage(
+                "score", score_batch, workers, batch_size=LLM_BATCH_SIZE
+            )
+        elif INGEST_EXTRACTION_MODE == "fused":
+            score_stage = PipelineStage("score", score_fused, workers)
+        else:
+            score_stage = PipelineStage("score", score, workers)
+
+        writer = CandidateWriter(
+            connection,
+            table_name,
+            columns,
+            existing_emails=existing["emails"] if dedupe_emails else None,
+        )
+
+        def insert(items):
+            results = writer.write_batch(items)
+            inserted = []
+            for item in results:
+                if item is not None and not isinstance(item, Exception):
+                    print(f"Candidate {item['index'] + 1} processed successfully")
+                    inserted.append(item["candidate_key"])
+            if checkpoint and inserted:
+                checkpoint.mark_many(inserted, "inserted")
+            return results
+
+        def on_error(stage, item, error):
+            if "pdf_path" in item and os.path.exists(item["pdf_path"]):
+                os.unlink(item["pdf_path"])
+            print(f"Error processing candidate {item['index'] + 1} ({stage}): {error}")
+
+        pipeline = IngestionPipeline(
+            [
+                PipelineStage("download", download, workers),
+                PipelineStage("extract", extract, INGEST_EXTRACT_WORKERS),
+                PipelineStage("prescreen", prescreen, 1),
+                score_stage,
+                PipelineStage("insert", insert, 1, batch_size=INGEST_INSERT_BATCH),
+            ],
+            on_error=on_error,
+            progress=progress,
+        )
+        try:
+            stats = pipeline.run(rows())
+        finally:
+            if checkpoint:
+                checkpoint.flush()
+        print(f"Resume cache: {resume_cache.stats()}")
+        print(f"PDF extraction: {pdf_extractor.stats()}")
+        return stats
+
+    def _score_candidate(self, item, candidate_info, jd_text):
+        print("Calculating match score...")
+        candidate_score = self._calculate_score(candidate_info, jd_text)
+        candidate_info["score"] = str(candidate_score)
+        print(f"Match score: {candidate_score}")
+        item["candidate_info"] = candidate_info
+        return item
+
     def _is_google_drive_url(self, url):
         return "drive.google.com" in url
 
@@ -661,68 +1101,103 @@ class ChatService:
             return url.split("/d/")[1].split("/")[0]
         return None
 
-    def _download_and_extract_resume(self, pdf_url):
+    def _download_resume(self, pdf_url):
+        temp_file_path = os.path.join(TEMP_DIR, f"{uuid.uuid4()}.pdf")
         try:
-
-            temp_file_path = os.path.join(TEMP_DIR, f"{uuid.uuid4()}.pdf")
-
             if self._is_google_drive_url(pdf_url):
                 file_id = self._get_google_drive_file_id(pdf_url)
                 if not file_id:
                     raise Exception("Invalid Google Drive URL")
 
-                gdown.download(
-                    f"https://drive.google.com/uc?id={file_id}",
-                    temp_file_path,
-                    quiet=False,
-                )
-
-                if (
-                    not os.path.exists(temp_file_path)
-                    or os.path.getsize(temp_file_path) == 0
-                ):
-                    raise Exception("Failed to download file from Google Drive")
+                resume_downloader.download_google_drive(file_id, temp_file_path)
             else:
-                response = requests.get(pdf_url)
-                if response.status_code != 200:
-                    raise Exception(f"Failed to download PDF: {response.status_code}")
+                resume_downloader.download(pdf_url, temp_file_path)
+
+            return temp_file_path
 
-                with open(temp_file_path, "wb") as temp_file:
-                    temp_file.write(response.content)
+        except Exception as e:
+            self._remove_temp_file(temp_file_path)
+            raise Exception(f"Error downloading PDF: {str(e)}")
 
-            pdf_reader = PdfReader(temp_file_path)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
+    def _read_pdf_text(self, file_path):
+        try:
+            result = pdf_extractor.extract(file_path)
+            print(
+                f"Parsed {result['pages']} page(s) with {result['engine']} in {result['seconds']:.3f}s"
+            )
+            return result["text"]
+        except Exception as e:
+            raise Exception(f"Error processing PDF: {str(e)}")
 
-            os.unlink(temp_file_path)
+    def _extract_resume_text(self, temp_file_path):
+        try:
+            return self._read_pdf_text(temp_file_path)
+        finally:
+            self._remove_temp_file(temp_file_path)
+
+    def _fetch_resume(self, pdf_url):
+        """Resolves a resume URL through the resume cache, downloading only on a miss."""
+        content_hash = resume_cache.content_hash_for_url(pdf_url)
+        if content_hash:
+            text = resume_cache.get_text(content_hash)
+            if text is not None:
+                return {"content_hash": content_hash, "resume_text": text}
+            if resume_cache.has_pdf(content_hash):
+                return {
+                    "content_hash": content_hash,
+                    "cached_pdf_path": resume_cache.pdf_path(content_hash),
+                }
+
+        pdf_path = self._download_resume(pdf_url)
+        try:
+            content_hash = resume_cache.store_pdf(pdf_url, pdf_path)
+        except Exception:
+            self._remove_temp_file(pdf_path)
+            raise
+        return {"content_hash": content_hash, "pdf_path": pdf_path}
+
+    def _resume_text(self, resume):
+        if "resume_text" in resume:
+            return resume["resume_text"]
+
+        content_hash = resume["content_hash"]
+        text = resume_cache.get_text(content_hash)
+        if text is not None:
+            if "pdf_path" in resume:
+                self._remove_temp_file(resume.pop("pdf_path"))
             return text
 
-        except Exception as e:
+        if "pdf_path" in resume:
+            text = self._extract_resume_text(resume.pop("pdf_path"))
+        else:
+            text = self._read_pdf_text(resume.pop("cached_pdf_path"))
+        resume_cache.store_text(content_hash, text)
+        return text
 
-            if "temp_file_path" in locals() and os.path.exists(temp_file_path):
-                try:
-                    os.unlink(temp_file_path)
-                except Exception as cleanup_error:
-                    print(
-                        f"Error cleaning up temporary file {temp_file_path}: {cleanup_error}"
-                    )
+    def _remove_temp_file(self, temp_file_path):
+        if os.path.exists(temp_file_path):
+            try:
+                os.unlink(temp_file_path)
+            except Exception as cleanup_error:
+                print(
+                    f"Error cleaning up temporary file {temp_file_path}: {cleanup_error}"
+                )
+
+    def _download_and_extract_resume(self, pdf_url):
+        try:
+            return self._resume_text(self._fetch_resume(pdf_url))
+        except Exception as e:
             raise Exception(f"Error downloading or processing PDF: {str(e)}")
 
     def _extract_candidate_info(self, resume_text):
+        resume_text = prompt_compactor.compact(resume_text, "resume")
         try:
-            response = litellm.completion(
-                model="gemini/gemini-2.0-flash",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f"Extract candidate information from this resume:\n{resume_text}\nReturn ONLY a JSON object with the extracted information. Structure the JSON with relevant keys like 'name', 'email', 'phone', 'linkedin', 'skills', 'experience', 'education'. Ensure the output is ONLY the JSON object, for example: {{ \"name\": \"John Doe\", \"email\": \"john.doe@example.com\" }}. Do NOT include any other text or formatting before or after the JSON.",
-                    }
-                ],
-                api_key=os.getenv("GOOGLE_API_KEY"),
+            response = llm_gateway.complete(
+                f"Extract candidate information from this resume:\n{resume_text}\nReturn ONLY a JSON object with the extracted information. Structure the JSON with relevant keys like 'name', 'email', 'phone', 'linkedin', 'skills', 'experience', 'education'. Ensure the output is ONLY the JSON object, for example: {{ \"name\": \"John Doe\", \"email\": \"john.doe@example.com\" }}. Do NOT include any other text or formatting before or after the JSON.",
+                call_site="candidate_info",
             )
 
-            llm_output_content = response.choices[0].message.content.strip()
+            llm_output_content = response.strip()
             print(f"Debug: Raw LLM output for candidate info: {llm_output_content}")
 
             if llm_output_content.startswith("```json"):
@@ -740,6 +1215,8 @@ class ChatService:
             raise Exception(f"Error extracting candidate info: {str(e)}")
 
     def _extract_candidate_info_for_jd(self, resume_text, jd_text, required_columns):
+        resume_text = prompt_compactor.compact(resume_text, "resume")
+        jd_text = prompt_compactor.compact(jd_text, "jd", summarize=True)
 
         try:
             columns_str = ", ".join(required_columns[:-1])
@@ -765,13 +1242,9 @@ class ChatService:
             Return ONLY the JSON object, no other text.
             """
 
-            response = litellm.completion(
-                model="gemini/gemini-2.0-flash",
-                messages=[{"role": "user", "content": prompt}],
-                api_key=os.getenv("GOOGLE_API_KEY"),
-            )
+            response = llm_gateway.complete(prompt, call_site="candidate_info_for_jd")
 
-            llm_output_content = response.choices[0].message.content.strip()
+            llm_output_content = response.strip()
             print(
                 f"Debug: Raw LLM output for JD-specific candidate info: {llm_output_content[:200]}..."
             )
@@ -801,19 +1274,197 @@ class ChatService:
         except Exception as e:
             raise Exception(f"Error extracting JD-specific candidate info: {str(e)}")
 
+    def _estimate_tokens(self, text):
+        return count_tokens(text)
+
+    def _plan_extraction_batches(self, resume_texts, jd_text):
+        """Groups resume indexes so that each prompt (JD + resumes) fits the token budget."""
+        budget = LLM_BATCH_TOKEN_BUDGET - self._estimate_tokens(jd_text) - 1000
+        batches = []
+        current, used = [], 0
+        for i, resume_text in enumerate(resume_texts):
+            tokens = self._estimate_tokens(resume_text)
+            if current and used + tokens > budget:
+                batches.append(current)
+                current, used = [], 0
+            current.append(i)
+            used += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _extract_candidates_info_for_jd_batch(
+        self, resume_texts, jd_text, required_columns
+    ):
+        """
+        Extracts several candidates in one LLM call that carries a single copy of the
+        JD. Returns one entry per resume; candidates the batch call could not
+        resolve are retried with `_extract_candidate_info_for_jd`.
+        """
+        results = [None] * len(resume_texts)
+        resume_texts = [prompt_compactor.compact(text, "resume") for text in resume_texts]
+        jd_text = prompt_compactor.compact(jd_text, "jd", summarize=True)
+        for batch in self._plan_extraction_batches(resume_texts, jd_text):
+            if len(batch) > 1:
+                try:
+                    parsed = self._extract_batch(
+                        [resume_texts[i] for i in batch], jd_text, required_columns
+                    )
+                    for position, i in enumerate(batch):
+                        results[i] = parsed.get(f"C{position + 1}")
+                except Exception as e:
+                    print(f"Batch extraction failed, falling back to single calls: {e}")
+
+            for i in batch:
+                if results[i] is not None:
+                    continue
+                try:
+                    results[i] = self._extract_candidate_info_for_jd(
+                        resume_texts[i], jd_text, required_columns
+                    )
+                except Exception as e:
+                    results[i] = e
+        return results
+
+    def _extract_batch(self, resume_texts, jd_text, required_columns):
+        columns_str = ", ".join(required_columns[:-1])
+        resumes_block = "\n\n".join(
+            [
+                f"=== Candidate C{i + 1} ===\n{resume_text}"
+                for i, resume_text in enumerate(resume_texts)
+            ]
+        )
+
+        prompt = f"""
+            Extract candidate information from each of the resumes below based on the job description requirements.
+
+            Job Description:
+            {jd_text}
+
+            Resumes:
+            {resumes_block}
+
+            Extract information for these specific fields: {columns_str}
+
+            For skills, include relevant technical skills, programming languages, frameworks, tools mentioned.
+            For experience, summarize relevant work history and projects.
+            For education, include degrees, certifications, relevant coursework.
+
+            Return ONLY a JSON object keyed by candidate id (C1, C2, ...), one entry per resume, each value being the JSON object of extracted fields.
+            Example format: {{"C1": {{"name": "John Doe", "email": "john@email.com", "skills": "Python, AWS"}}, "C2": {{"name": "Jane Roe", "email": "jane@email.com", "skills": "Java"}}}}
+
+            Return ONLY the JSON object, no other text.
+            """
+
+        response = llm_gateway.complete(prompt, call_site="candidate_info_batch")
+
+        llm_output_content = response.strip()
+        if llm_output_content.startswith("```json"):
+            llm_output_content = llm_output_content[len("```json") :].lstrip()
+        if llm_output_content.endswith("```"):
+            llm_output_content = llm_output_content[: -len("```")].rstrip()
+
+        parsed = json.loads(llm_output_content)
+        if not isinstance(parsed, dict):
+            raise ValueError("Expected a JSON object keyed by candidate id")
+
+        candidates = {}
+        for key, candidate_info in parsed.items():
+            if not isinstance(candidate_info, dict):
+                continue
+            for col in required_columns:
+                if col != "score" and col not in candidate_info:
+                    candidate_info[col] = ""
+            candidates[key.strip()] = candidate_info
+        return candidates
+
+    def _extract_and_score_candidate(self, resume_text, jd_text, required_columns):
+        """
+        Extracts the column values and scores the candidate in a single LLM call.
+        Falls back to the two-call path when the fused response cannot be used.
+        """
+        resume_text = prompt_compactor.compact(resume_text, "resume")
+        jd_text = prompt_compactor.compact(jd_text, "jd", summarize=True)
+        columns_str = ", ".join(required_columns[:-1])
+
+        prompt = f"""
+            Extract candidate information from this resume based on the job description requirements, then score how well the candidate matches the job.
+
+            Job Description:
+            {jd_text}
+
+            Resume Text:
+            {resume_text}
+
+            Extract information for these specific fields: {columns_str}
+
+            For skills, include relevant technical skills, programming languages, frameworks, tools mentioned.
+            For experience, summarize relevant work history and projects.
+            For education, include degrees, certifications, relevant coursework.
+
+            Also calculate a match score (0-100) between this candidate and the job description, with a one or two sentence rationale.
+
+            Return ONLY a JSON object in this format:
+            {{"fields": {{"name": "John Doe", "email": "john@email.com", "skills": "Python, Machine Learning, AWS", "experience": "5 years in AI development"}}, "score": 78.5, "rationale": "Strong Python and ML background, limited cloud experience."}}
+
+            Return ONLY the JSON object, no other text.
+            """
+
+        try:
+            response = llm_gateway.complete(prompt, call_site="extract_and_score")
+
+            llm_output_content = response.strip()
+            if llm_output_content.startswith("```json"):
+                llm_output_content = llm_output_content[len("```json") :].lstrip()
+            if llm_output_content.endswith("```"):
+                llm_output_content = llm_output_content[: -len("```")].rstrip()
+
+            parsed = json.loads(llm_output_content)
+            candidate_info = parsed["fields"]
+            if not isinstance(candidate_info, dict):
+                raise ValueError("Expected 'fields' to be a JSON object")
+        except Exception as e:
+            print(f"Fused extraction failed, falling back to separate calls: {e}")
+            candidate_info = self._extract_candidate_info_for_jd(
+                resume_text, jd_text, required_columns
+            )
+            candidate_info["score"] = str(
+                self._calculate_score(candidate_info, jd_text)
+            )
+            return candidate_info
+
+        for col in required_columns:
+            if col != "score" and col not in candidate_info:
+                candidate_info[col] = ""
+
+        try:
+            score = float(parsed.get("score"))
+            if not 0 <= score <= 100:
+                raise ValueError(f"Score {score} out of range")
+        except (TypeError, ValueError) as e:
+            print(f"Fused score unusable, rescoring separately: {e}")
+            score = self._calculate_score(candidate_info, jd_text)
+
+        print(f"Score rationale: {parsed.get('rationale', '')}")
+        candidate_info["score"] = str(score)
+        return candidate_info
+
     def _calculate_score(self, candidate_info, jd_text):
+        candidate = prompt_compactor.compact_json(candidate_info, "candidate")
+        jd_text = prompt_compactor.compact(jd_text, "jd", summarize=True)
         try:
-            response = litellm.completion(
-                model="gemini/gemini-2.0-flash",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f"Calculate a match score (0-100) between this candidate and job description. Return ONLY the score number as a float.\nCandidate: {json.dumps(candidate_info)}\nJob Description: {jd_text}",
-                    }
-                ],
-                api_key=os.getenv("GOOGLE_API_KEY"),
+            response = llm_gateway.complete(
+                f"Calculate a match score (0-100) between this candidate and job description. Return ONLY the score number as a float.\nCandidate: {candidate}\nJob Description: {jd_text}",
+                call_site="score",
             )
-            return float(response.choices[0].message.content.strip())
+            try:
+                return float(response.strip())
+            except ValueError:
+                # tolerate answers like "Score: 78.5" instead of failing the candidate
+                match = SCORE_PATTERN.search(response)
+                if not match or not 0 <= float(match.group(1)) <= 100:
+                    raise
+                return float(match.group(1))
         except Exception as e:
             raise Exception(f"Error calculating score: {str(e)}")
 
@@ -1075,13 +1726,9 @@ class ChatService:
         """
 
         # Step 2: Get response from LLM
-        response = litellm.completion(
-            model="gemini/gemini-2.0-flash",
-            messages=[{"role": "user", "content": prompt}],
-            api_key=os.getenv("GOOGLE_API_KEY"),
-        )
+        response = llm_gateway.complete(prompt, call_site="email_composer")
 
-        raw_output = response.choices[0].message.content.strip()
+        raw_output = response.strip()
         raw_output = raw_output.replace("```json", "").replace("```", "").strip()
         print("LLM Email Composer Raw Output:", raw_output)
 
@@ -1145,13 +1792,9 @@ class ChatService:
             """
 
         try:
-            response = litellm.completion(
-                model="gemini/gemini-2.0-flash",
-                messages=[{"role": "user", "content": prompt}],
-                api_key=os.getenv("GOOGLE_API_KEY"),
-            )
+            response = llm_gateway.complete(prompt, call_site="calendar_event")
 
-            raw_output = response.choices[0].message.content.strip()
+            raw_output = response.strip()
             raw_output = raw_output.replace("```json", "").replace("```", "").strip()
             print("LLM Calendar Event Raw Output:", raw_output)
 
@@ -1201,15 +1844,9 @@ class ChatService:
             connection = self._get_db_connection()
             cursor = connection.cursor()
 
-            cursor.execute(
-                f"""
-                SELECT jd_content 
-                FROM private.jobDesc 
-                WHERE table_name = %s
-                """,
-                (table_name,),
+            jd_data = prompt_compactor.compact(
+                self._get_stored_job_description(cursor, table_name) or "", "jd"
             )
-            jd_data = cursor.fetchall()
 
             prompt = f"""
                 You are an AI assistant that summarizes job descriptions into concise, point-wise highlights.
@@ -1234,13 +1871,9 @@ class ChatService:
             """
 
             # tables = [row[0] for row in jd_data]
-            response = litellm.completion(
-                model="gemini/gemini-2.0-flash",
-                messages=[{"role": "user", "content": prompt}],
-                api_key=os.getenv("GOOGLE_API_KEY"),
-            )
+            response = llm_gateway.complete(prompt, call_site="job_description_summary")
 
-            raw_output = response.choices[0].message.content.strip()
+            raw_output = response.strip()
 
             cursor.close()
             connection.close()
@@ -1267,13 +1900,9 @@ class ChatService:
         """
 
         # Step 2: Get response from LLM
-        response = litellm.completion(
-            model="gemini/gemini-2.0-flash",
-            messages=[{"role": "user", "content": prompt}],
-            api_key=os.getenv("GOOGLE_API_KEY"),
-        )
+        response = llm_gateway.complete(prompt, call_site="bestfit_name")
 
-        raw_output = response.choices[0].message.content.strip()
+        raw_output = response.strip()
         raw_output = raw_output.replace("```json", "").replace("```", "").strip()
         print("LLM Email Composer Raw Output:", raw_output)
 
@@ -1297,16 +1926,16 @@ class ChatService:
                         """,
                         (candidate_details["name"],),
                     )
-                    resume_data = cursor.fetchone()
-                    cursor.execute(
-                        f"""
-                        SELECT jd_content 
-                        FROM private.jobDesc 
-                        WHERE table_name = %s
-                        """,
-                        (table_name,),
+                    resume_row = cursor.fetchone()
+                    # the answer quotes the resume verbatim, so it is only cut, never rewritten
+                    resume_data = truncate_sections(
+                        resume_row[0] if resume_row else "", prompt_budget("resume")
+                    )
+                    job_description = prompt_compactor.compact(
+                        self._get_stored_job_description(cursor, table_name) or "",
+                        "jd",
+                        summarize=True,
                     )
-                    job_description = cursor.fetchone()
 
                     cursor.close()
                     connection.close()
@@ -1335,13 +1964,9 @@ class ChatService:
                     """
 
                     # Step 2: Get response from LLM
-                    response = litellm.completion(
-                        model="gemini/gemini-2.0-flash",
-                        messages=[{"role": "user", "content": prompt}],
-                        api_key=os.getenv("GOOGLE_API_KEY"),
-                    )
+                    response = llm_gateway.complete(prompt, call_site="bestfit_highlights")
 
-                    raw_output = response.choices[0].message.content.strip()
+                    raw_output = response.strip()
                     raw_output = (
                         raw_output.replace("```json", "").replace("```", "").strip()
                     )
@@ -0,0 +1,36 @@
+import os
+import pandas as pd
+
+CSV_CHUNK_SIZE = int(os.getenv("CSV_CHUNK_SIZE", 500))
+REQUIRED_CSV_COLUMNS = ("name", "pdf_url")
+
+
+class CandidateCsvReader:
+    """
+    Reads a candidates CSV `chunksize` rows at a time so a large ATS export never
+    has to fit in memory. Iterating yields `(index, row)` pairs like
+    `DataFrame.iterrows()`, with the index running across chunks.
+    """
+
+    def __init__(self, csv_path, chunksize=CSV_CHUNK_SIZE):
+        self.csv_path = csv_path
+        self.chunksize = chunksize
+        self.columns = list(pd.read_csv(csv_path, nrows=0).columns)
+
+    def validate(self):
+        missing = [col for col in REQUIRED_CSV_COLUMNS if col not in self.columns]
+        if missing:
+            raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+
+    def count_rows(self):
+        total = 0
+        for chunk in pd.read_csv(
+            self.csv_path, usecols=[self.columns[0]], chunksize=self.chunksize * 20
+        ):
+            total += len(chunk)
+        return total
+
+    def __iter__(self):
+        for chunk in pd.read_csv(self.csv_path, chunksize=self.chunksize):
+            for index, row in chunk.iterrows():
+                yield index, row
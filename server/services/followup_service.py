@@ -0,0 +1,60 @@
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+FOLLOWUP_WORKERS = int(os.getenv("FOLLOWUP_WORKERS", 4))
+FOLLOWUP_HISTORY = int(os.getenv("FOLLOWUP_HISTORY", 1000))
+
+
+class FollowupService:
+    """
+    Generates followup questions for a chat answer in the background, keyed by
+    the answer's message id, so the answer itself can be returned immediately.
+    The most recent FOLLOWUP_HISTORY results are kept for retrieval.
+    """
+
+    def __init__(self, max_workers=FOLLOWUP_WORKERS, history=FOLLOWUP_HISTORY):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="followups"
+        )
+        self.history = history
+        self.futures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, message_id, fn):
+        """Queues `fn()`, which returns the list of followup questions."""
+        future = self.executor.submit(self._run, message_id, fn)
+        with self._lock:
+            self.futures[message_id] = future
+            while len(self.futures) > self.history:
+                self.futures.popitem(last=False)
+        return future
+
+    def _run(self, message_id, fn):
+        try:
+            return fn()
+        except Exception:
+            print(f"Followups for {message_id} failed: {traceback.format_exc()}")
+            raise
+
+    def get(self, message_id, timeout=0):
+        """
+        Returns {"status", "followups"}, waiting up to `timeout` seconds for a
+        pending result. Status is "pending", "ready", "failed" or "unknown".
+        """
+        with self._lock:
+            future = self.futures.get(message_id)
+        if future is None:
+            return {"status": "unknown", "followups": None}
+        try:
+            followups = future.result(timeout=timeout or 0)
+        except FutureTimeoutError:
+            return {"status": "pending", "followups": None}
+        except Exception:
+            return {"status": "failed", "followups": []}
+        return {"status": "ready", "followups": followups}
+
+
+followup_service = FollowupService()
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# candidate states in the order they are reached; a checkpoint never moves backwards
+CHECKPOINT_STATES = ("downloaded", "extracted", "scored", "inserted")
+STATE_ORDER_SQL = "ARRAY[" + ",".join(f"'{state}'" for state in CHECKPOINT_STATES) + "]"
+# buffered marks are written once this many candidates are pending or this many
+# seconds have passed; "inserted" marks are written straight away
+CHECKPOINT_BATCH_SIZE = int(os.getenv("CHECKPOINT_BATCH_SIZE", 25))
+CHECKPOINT_FLUSH_SECONDS = float(os.getenv("CHECKPOINT_FLUSH_SECONDS", 2))
+
+
+def ingestion_run_id(table_name, mode, jd_text, csv_path):
+    """Same table, mode, JD and CSV contents -> same run id, so a retry resumes."""
+    digest = hashlib.sha256()
+    digest.update(f"{table_name}\0{mode}\0".encode("utf-8"))
+    digest.update((jd_text or "").encode("utf-8"))
+    with open(csv_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunCheckpoint:
+    """
+    Per-candidate progress of one ingestion run, bound to its run id. Marks are
+    buffered, merged per candidate and written in batches; call `flush` when the
+    run ends.
+    """
+
+    def __init__(
+        self,
+        store,
+        run_id,
+        batch_size=CHECKPOINT_BATCH_SIZE,
+        flush_seconds=CHECKPOINT_FLUSH_SECONDS,
+    ):
+        self.store = store
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def _merge(self, candidate_key, state, content_hash, candidate_info):
+        previous = self._pending.get(candidate_key)
+        if previous:
+            if CHECKPOINT_STATES.index(previous[0]) > CHECKPOINT_STATES.index(state):
+                state = previous[0]
+            content_hash = content_hash or previous[1]
+            candidate_info = candidate_info if candidate_info is not None else previous[2]
+        self._pending[candidate_key] = (state, content_hash, candidate_info)
+
+    def mark(self, candidate_key, state, content_hash=None, candidate_info=None):
+        with self._lock:
+            self._merge(candidate_key, state, content_hash, candidate_info)
+            due = (
+                len(self._pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_seconds
+            )
+        if due:
+            self.flush()
+
+    def mark_many(self, candidate_keys, state):
+        """Marks `candidate_keys` and writes everything pending right away."""
+        with self._lock:
+            for key in candidate_keys:
+                self._merge(key, state, None, None)
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            entries = [(key, *entry) for key, entry in self._pending.items()]
+            self._pending = {}
+            self._last_flush = time.monotonic()
+        if entries:
+            self.store.mark(self.run_id, entries)
+
+
+class IngestionCheckpointStore:
+    """
+    Persists ingestion runs and the furthest state each candidate reached
+    (downloaded -> extracted -> scored -> inserted) in Postgres, so a run that
+    died half way can skip inserted candidates and reuse paid-for LLM results.
+    A mark for an earlier state than the stored one does not change it.
+    """
+
+    def __init__(self):
+        self.connection_string = os.getenv("CONNECTION_URL")
+        self.connection = None
+        self._lock = threading.Lock()
+        self._ensured = False
+
+    def _get_connection(self):
+        if not self.connection or self.connection.closed:
+            parsed = urlparse(self.connection_string)
+            self.connection = psycopg2.connect(
+                host=parsed.hostname,
+                port=parsed.port or 5432,
+                user=parsed.username,
+                password=parsed.password,
+                database=parsed.path.lstrip("/"),
+            )
+            self.connection.autocommit = True
+        if not self._ensured:
+            self._ensure_tables(self.connection)
+            self._ensured = True
+        return self.connection
+
+    def _ensure_tables(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS private.ingestion_runs (
+                    run_id TEXT PRIMARY KEY,
+                    table_name TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stats TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """
+            )
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS private.ingestion_candidates (
+                    run_id TEXT NOT NULL,
+                    candidate_key TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    content_hash TEXT,
+                    candidate_info TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (run_id, candidate_key)
+                )
+            """
+            )
+        finally:
+            cursor.close()
+
+    def _execute(self, fn):
+        with self._lock:
+            connection = self._get_connection()
+            cursor = connection.cursor()
+            try:
+                return fn(cursor)
+            finally:
+                cursor.close()
+
+    def get_run(self, run_id):
+        def query(cursor):
+            cursor.execute(
+                "SELECT table_name, status FROM private.ingestion_runs WHERE run_id = %s",
+                (run_id,),
+            )
+            row = cursor.fetchone()
+            return {"table_name": row[0], "status": row[1]} if row else None
+
+        return self._execute(query)
+
+    def start_run(self, run_id, table_name, resume=False):
+        """Marks the run as running; a fresh (non-resumed) start forgets old candidate state."""
+
+        def query(cursor):
+            if not resume:
+                cursor.execute(
+                    "DELETE FROM private.ingestion_candidates WHERE run_id = %s",
+                    (run_id,),
+                )
+            cursor.execute(
+                """
+                INSERT INTO private.ingestion_runs (run_id, table_name, status, updated_at)
+                VALUES (%s, %s, 'running', %s)
+                ON CONFLICT (run_id) DO UPDATE
+                SET status = 'running', stats = NULL, updated_at = EXCLUDED.updated_at
+                """,
+                (run_id, table_name, datetime.now()),
+            )
+
+        self._execute(query)
+        return RunCheckpoint(self, run_id)
+
+    def supersede_runs(self, table_name, except_run_id=None):
+        """
+        Marks the table's unfinished runs as superseded once the table has been
+        rebuilt, so they start over instead of resuming onto rows they never wrote.
+        """
+
+        def query(cursor):
+            cursor.execute(
+                """
+                UPDATE private.ingestion_runs
+                SET status = 'superseded', updated_at = %s
+                WHERE table_name = %s AND status = 'running' AND run_id IS DISTINCT FROM %s
+                """,
+                (datetime.now(), table_name, except_run_id),
+            )
+
+        self._execute(query)
+
+    def finish_run(self, run_id, stats):
+        def query(cursor):
+            cursor.execute(
+                """
+                UPDATE private.ingestion_runs
+                SET status = 'completed', stats = %s, updated_at = %s
+                WHERE run_id = %s
+                """,
+                (json.dumps(stats), datetime.now(), run_id),
+            )
+
+        self._execute(query)
+
+    def load_candidates(self, run_id):
+        """Returns {candidate_key: {"state", "content_hash", "candidate_info"}}."""
+
+        def query(cursor):
+            cursor.execute(
+                """
+                SELECT candidate_key, state, content_hash, candidate_info
+                FROM private.ingestion_candidates
+                WHERE run_id = %s
+                """,
+                (run_id,),
+            )
+            return {
+                key: {
+                    "state": state,
+                    "content_hash": content_hash,
+                    "candidate_info": json.loads(info) if info else None,
+                }
+                for key, state, content_hash, info in cursor.fetchall()
+            }
+
+        return self._execute(query)
+
+    def mark(self, run_id, entries):
+        now = datetime.now()
+        rows = [
+            (
+                run_id,
+                key,
+                state,
+                content_hash,
+                json.dumps(candidate_info) if candidate_info is not None else None,
+                now,
+            )
+            for key, state, content_hash, candidate_info in entries
+        ]
+
+        def query(cursor):
+            execute_values(
+                cursor,
+                f"""
+                INSERT INTO private.ingestion_candidates
+                    (run_id, candidate_key, state, content_hash, candidate_info, updated_at)
+                VALUES %s
+                ON CONFLICT (run_id, candidate_key) DO UPDATE
+                SET state = EXCLUDED.state,
+                    content_hash = COALESCE(EXCLUDED.content_hash, private.ingestion_candidates.content_hash),
+                    candidate_info = COALESCE(EXCLUDED.candidate_info, private.ingestion_candidates.candidate_info),
+                    updated_at = EXCLUDED.updated_at
+                WHERE array_position({STATE_ORDER_SQL}, EXCLUDED.state)
+                    >= array_position({STATE_ORDER_SQL}, private.ingestion_candidates.state)
+                """,
+                rows,
+            )
+
+        self._execute(query)
+
+
+ingestion_checkpoints = IngestionCheckpointStore()
@@ -0,0 +1,303 @@
+import os
+import queue
+import threading
+import time
+import traceback
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 8))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 16))
+INGEST_BATCH_WAIT = float(os.getenv("INGEST_BATCH_WAIT", 1.0))
+
+_DONE = object()
+
+
+class PipelineStage:
+    """
+    A named step of the pipeline. With `batch_size` > 1 the handler receives a list
+    of up to that many items (whatever arrived within `batch_wait` seconds) and must
+    return a list of the same length holding either the result or the Exception
+    for each item, so one bad item does not fail the whole batch.
+    """
+
+    def __init__(self, name, handler, workers=1, batch_size=1, batch_wait=None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.batch_wait = INGEST_BATCH_WAIT if batch_wait is None else batch_wait
+
+
+class IngestionProgress:
+    """Thread-safe counters and per-stage timings for one ingestion run."""
+
+    def __init__(self, total=None, keep_samples=False):
+        self._lock = threading.Lock()
+        self.expected_total = total
+        self.keep_samples = keep_samples
+        self.fed = 0
+        self.processed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.started_at = None
+        self.finished_at = None
+        self.stages = {}
+
+    def start(self):
+        with self._lock:
+            self.started_at = time.time()
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = time.time()
+
+    def item_fed(self):
+        with self._lock:
+            self.fed += 1
+
+    def item_processed(self):
+        with self._lock:
+            self.processed += 1
+
+    def item_skipped(self):
+        with self._lock:
+            self.skipped += 1
+
+    def item_failed(self):
+        with self._lock:
+            self.failed += 1
+
+    def record_stage(self, name, seconds, ok=True):
+        with self._lock:
+            stage = self.stages.setdefault(
+                name, {"count": 0, "errors": 0, "total_seconds": 0.0}
+            )
+            stage["count"] += 1
+            stage["total_seconds"] += seconds
+            if self.keep_samples:
+                stage.setdefault("samples", []).append(seconds)
+            if not ok:
+                stage["errors"] += 1
+
+    def stage_samples(self, name):
+        with self._lock:
+            return list(self.stages.get(name, {}).get("samples", []))
+
+    @property
+    def total(self):
+        return self.expected_total if self.expected_total is not None else self.fed
+
+    def eta_seconds(self):
+        with self._lock:
+            if self.finished_at:
+                return 0.0
+            done = self.processed + self.failed + self.skipped
+            if not self.started_at or not done:
+                return None
+            elapsed = time.time() - self.started_at
+            return max(0.0, (self.total - done) * elapsed / done)
+
+    def to_dict(self):
+        eta = self.eta_seconds()
+        with self._lock:
+            end = self.finished_at or time.time()
+            return {
+                "total": self.total,
+                "processed": self.processed,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "elapsed_seconds": (
+                    round(end - self.started_at, 3) if self.started_at else 0.0
+                ),
+                "eta_seconds": round(eta, 3) if eta is not None else None,
+                "stages": {
+                    name: {
+                        "count": stage["count"],
+                        "errors": stage["errors"],
+                        "total_seconds": round(stage["total_seconds"], 3),
+                        "avg_seconds": (
+                            round(stage["total_seconds"] / stage["count"], 3)
+                            if stage["count"]
+                            else 0.0
+                        ),
+                    }
+                    for name, stage in self.stages.items()
+                },
+            }
+
+
+class IngestionPipeline:
+    """
+    Pushes candidate items through a chain of stages. Every stage runs on its own
+    worker threads and stages are joined by bounded queues, so a slow stage
+    blocks the stages feeding it instead of letting work pile up in memory.
+    A failing item is reported through `on_error` and dropped; the rest keep going.
+    A handler may return None to drop an item deliberately; it is counted as skipped.
+    """
+
+    def __init__(
+        self, stages, queue_size=INGEST_QUEUE_SIZE, on_error=None, progress=None
+    ):
+        if not stages:
+            raise ValueError("IngestionPipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = max(1, int(queue_size))
+        self.on_error = on_error
+        self.progress = progress or IngestionProgress()
+        self._feed_error = None
+
+    def _report_error(self, stage, item, error):
+        self.progress.item_failed()
+        if self.on_error:
+            try:
+                self.on_error(stage.name, item, error)
+            except Exception:
+                traceback.print_exc()
+        else:
+            print(f"Error in stage {stage.name}: {error}")
+
+    def _run_worker(self, stage, inbox, outbox):
+        if stage.batch_size > 1:
+            return self._run_batch_worker(stage, inbox, outbox)
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                return
+            started = time.perf_counter()
+            try:
+                result = stage.handler(item)
+            except Exception as e:
+                self.progress.record_stage(
+                    stage.name, time.perf_counter() - started, ok=False
+                )
+                self._report_error(stage, item, e)
+                continue
+            self.progress.record_stage(stage.name, time.perf_counter() - started)
+            self._forward(result, outbox)
+
+    def _forward(self, result, outbox):
+        # a handler returning None drops the item on purpose (e.g. a duplicate)
+        if result is None:
+            self.progress.item_skipped()
+        else:
+            outbox.put(result)
+
+    def _next_batch(self, stage, inbox):
+        item = inbox.get()
+        if item is _DONE:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + stage.batch_wait
+        while len(batch) < stage.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = inbox.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run_batch_worker(self, stage, inbox, outbox):
+        done = False
+        while not done:
+            batch, done = self._next_batch(stage, inbox)
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                results = stage.handler(batch)
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"Stage {stage.name} returned {len(results)} results for {len(batch)} items"
+                    )
+            except Exception as e:
+                results = [e] * len(batch)
+            per_item = (time.perf_counter() - started) / len(batch)
+            for item, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    self.progress.record_stage(stage.name, per_item, ok=False)
+                    self._report_error(stage, item, result)
+                else:
+                    self.progress.record_stage(stage.name, per_item)
+                    self._forward(result, outbox)
+
+    def _run_stage(self, stage, inbox, outbox, downstream_workers):
+        threads = [
+            threading.Thread(
+                target=self._run_worker,
+                args=(stage, inbox, outbox),
+                name=f"ingest-{stage.name}-{i}",
+                daemon=True,
+            )
+            for i in range(stage.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for _ in range(downstream_workers):
+            outbox.put(_DONE)
+
+    def _feed(self, items, outbox, downstream_workers):
+        try:
+            for item in items:
+                self.progress.item_fed()
+                outbox.put(item)
+        except Exception as e:
+            self._feed_error = e
+        finally:
+            for _ in range(downstream_workers):
+                outbox.put(_DONE)
+
+    def run(self, items):
+        self.progress.start()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        # the sink is drained by the calling thread, so it never needs to block
+        queues.append(queue.Queue())
+
+        supervisors = [
+            threading.Thread(
+                target=self._feed,
+                args=(items, queues[0], self.stages[0].workers),
+                name="ingest-feeder",
+                daemon=True,
+            )
+        ]
+        for i, stage in enumerate(self.stages):
+            downstream_workers = (
+                self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            )
+            supervisors.append(
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(stage, queues[i], queues[i + 1], downstream_workers),
+                    name=f"ingest-{stage.name}",
+                    daemon=True,
+                )
+            )
+        for thread in supervisors:
+            thread.start()
+
+        sink = queues[-1]
+        while True:
+            item = sink.get()
+            if item is _DONE:
+                break
+            self.progress.item_processed()
+
+        for thread in supervisors:
+            thread.join()
+        self.progress.finish()
+
+        if self._feed_error is not None:
+            raise self._feed_error
+
+        return {
+            "processed": self.progress.processed,
+            "failed": self.progress.failed,
+            "skipped": self.progress.skipped,
+            "total": self.progress.total,
+        }
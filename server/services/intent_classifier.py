@@ -0,0 +1,207 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from services.metrics import metrics
+
+INTENT_LABELS = ("sql", "bestfit", "gmail", "calendar", "unknown")
+# below this confidence the caller should ask the LLM instead
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", 0.8))
+INTENT_RULE_CONFIDENCE = 0.95
+# intents that send mail or touch calendars; the LLM always confirms these
+CONFIRM_INTENTS = ("gmail", "calendar")
+INTENT_LOG_PATH = os.getenv(
+    "INTENT_LOG_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "cache", "intent_examples.jsonl"),
+)
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+INTENT_RULES = {
+    "gmail": re.compile(
+        r"\bgmail\b|\binbox\b|\b(send|draft|write|compose|reply|forward)\b.*\b(e-?mail|mail|message|note)\b"
+    ),
+    "calendar": re.compile(
+        r"\b(calendar|reschedule|schedule)\b|\b(set up|arrange|book)\b.*\b(meeting|interview|call|slot)\b|\binvite\b"
+    ),
+    "bestfit": re.compile(
+        r"\bwhy\b.*\b(fit|suitable|good|best|right|strong|better)\b|\bhighlight\b.*\b(resume|cv)\b"
+        r"|\b(proofs?|evidence)\b.*\b(fit|match(es)?|suitable|resume|cv)\b"
+    ),
+    "sql": re.compile(
+        r"\b(how many|list|show me|count|average|top \d+|which candidates?|who (has|have|knows?|is))\b"
+    ),
+}
+
+SEED_EXAMPLES = [
+    ("how many candidates know python", "sql"),
+    ("list all candidates with more than 5 years of experience", "sql"),
+    ("show me the top 3 candidates by score", "sql"),
+    ("who has worked with react and node", "sql"),
+    ("what is the average score of the candidates", "sql"),
+    ("which candidates are from bangalore", "sql"),
+    ("give me the phone number of rahul", "sql"),
+    ("find candidates with a masters degree", "sql"),
+    ("what is the email address of rahul", "sql"),
+    ("email id of neha", "sql"),
+    ("give me the mail ids of the shortlisted candidates", "sql"),
+    ("why is mansi a good fit for this role", "bestfit"),
+    ("why do you think rahul is the best candidate", "bestfit"),
+    ("show proof that priya matches the job description", "bestfit"),
+    ("highlight the relevant skills in arjun's resume", "bestfit"),
+    ("what makes neha suitable for the job", "bestfit"),
+    ("send an email to rahul about the next round", "gmail"),
+    ("email the shortlisted candidates", "gmail"),
+    ("draft a rejection mail to priya", "gmail"),
+    ("reply to arjun's message", "gmail"),
+    ("mail neha the offer details", "gmail"),
+    ("schedule an interview with rahul tomorrow at 3pm", "calendar"),
+    ("set up a meeting with priya next monday", "calendar"),
+    ("book a call with arjun on friday", "calendar"),
+    ("create a calendar event for the interview with neha", "calendar"),
+    ("reschedule mansi's interview to next week", "calendar"),
+    ("hello", "unknown"),
+    ("what's the weather like today", "unknown"),
+    ("tell me a joke", "unknown"),
+    ("thanks", "unknown"),
+]
+
+
+def intent_features(text):
+    words = WORD_PATTERN.findall((text or "").lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class IntentClassifier:
+    """
+    Local intent router: keyword rules first, then a multinomial naive Bayes
+    model over unigrams and bigrams. It is trained on seed examples plus every
+    query the LLM had to label, which are appended to `log_path`, so it learns
+    from its own fallbacks.
+    """
+
+    def __init__(
+        self, threshold=INTENT_CONFIDENCE_THRESHOLD, log_path=INTENT_LOG_PATH
+    ):
+        self.threshold = threshold
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._label_counts = Counter()
+        self._feature_counts = {label: Counter() for label in INTENT_LABELS}
+        self._feature_totals = Counter()
+        self._vocabulary = set()
+        self._stats = {"calls": 0, "rules": 0, "model": 0, "fallbacks": 0}
+
+        for question, label in SEED_EXAMPLES:
+            self._train(question, label)
+        for question, label in self._load_log():
+            self._train(question, label)
+
+    def _load_log(self):
+        if not os.path.exists(self.log_path):
+            return []
+        examples = []
+        with open(self.log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("intent") in INTENT_LABELS:
+                    examples.append((entry["question"], entry["intent"]))
+        return examples
+
+    def _train(self, question, label):
+        features = intent_features(question)
+        self._label_counts[label] += 1
+        self._feature_counts[label].update(features)
+        self._feature_totals[label] += len(features)
+        self._vocabulary.update(features)
+
+    def _posteriors(self, features, labels):
+        total = sum(self._label_counts.values())
+        vocab_size = len(self._vocabulary) + 1
+        log_scores = {}
+        for label in labels:
+            score = math.log((self._label_counts[label] + 1) / (total + len(INTENT_LABELS)))
+            denominator = self._feature_totals[label] + vocab_size
+            for feature in features:
+                score += math.log((self._feature_counts[label][feature] + 1) / denominator)
+            log_scores[label] = score
+        best = max(log_scores.values())
+        weights = {label: math.exp(score - best) for label, score in log_scores.items()}
+        norm = sum(weights.values())
+        return {label: weight / norm for label, weight in weights.items()}
+
+    def predict(self, question):
+        """Returns (intent, confidence, source) where source is "rules" or "model"."""
+        text = (question or "").lower()
+        matched = [label for label, rule in INTENT_RULES.items() if rule.search(text)]
+        if len(matched) == 1:
+            return matched[0], INTENT_RULE_CONFIDENCE, "rules"
+
+        # Several rules firing narrows the choice down to those labels
+        with self._lock:
+            posteriors = self._posteriors(intent_features(text), matched or INTENT_LABELS)
+        intent = max(posteriors, key=posteriors.get)
+        return intent, posteriors[intent], "model"
+
+    def classify(self, question):
+        """
+        Returns the intent, or None when the caller should fall back to the LLM.
+        Intents in CONFIRM_INTENTS have side effects and always fall back.
+        """
+        intent, confidence, source = self.predict(question)
+        with self._lock:
+            self._stats["calls"] += 1
+            if confidence >= self.threshold and intent not in CONFIRM_INTENTS:
+                self._stats[source] += 1
+                return intent
+            self._stats["fallbacks"] += 1
+        return None
+
+    def learn(self, question, intent):
+        """Adds an LLM-labelled query to the model and the training log."""
+        if intent not in INTENT_LABELS:
+            return
+        with self._lock:
+            self._train(question, intent)
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"question": question, "intent": intent}) + "\n")
+            except OSError as e:
+                print(f"Could not log intent example: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["fallback_rate"] = (
+            stats["fallbacks"] / stats["calls"] if stats["calls"] else 0.0
+        )
+        return stats
+
+
+intent_classifier = IntentClassifier()
+
+
+def _intent_metrics():
+    stats = intent_classifier.stats()
+    return [
+        (
+            "intent_classifications",
+            "Intent classifications by the source that answered (rules, model, fallbacks).",
+            [({"source": source}, stats[source]) for source in ("rules", "model", "fallbacks")],
+        ),
+        (
+            "intent_fallback_rate",
+            "Share of intent classifications that fell back to the LLM.",
+            [({}, stats["fallback_rate"])],
+        ),
+    ]
+
+
+metrics.register_collector(_intent_metrics)
@@ -0,0 +1,121 @@
+import os
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from services.ingestion_pipeline import IngestionProgress
+
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", 4))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", 200))
+
+
+class JobConflictError(Exception):
+    """Raised when a table already has an ingestion job queued or running."""
+
+    def __init__(self, job):
+        super().__init__(f"An ingestion job for {job.table_name} is already {job.status}")
+        self.job = job
+
+
+class IngestionJob:
+    def __init__(self, table_name, total=None):
+        self.id = str(uuid.uuid4())
+        self.table_name = table_name
+        self.status = "queued"
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.progress = IngestionProgress(total)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "table_name": self.table_name,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "result": self.result,
+            "error": self.error,
+            **self.progress.to_dict(),
+        }
+
+
+class JobService:
+    """
+    Runs ingestion jobs on a background executor so /newChat can return straight
+    away. Only one job per table may be queued or running at a time, since two jobs
+    would rebuild or insert into the same table concurrently. Finished jobs are kept
+    in memory (bounded by INGEST_JOB_HISTORY) for polling.
+    """
+
+    def __init__(self, max_workers=INGEST_JOB_WORKERS, history=INGEST_JOB_HISTORY):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ingest-job"
+        )
+        self.history = history
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, table_name, fn, total=None, on_done=None):
+        """
+        Queues `fn(progress)` and returns the job; `on_done` always runs afterwards.
+        Raises JobConflictError if `table_name` already has an unfinished job.
+        """
+        job = IngestionJob(table_name, total)
+        with self._lock:
+            active = self.active_job(table_name)
+            if active:
+                raise JobConflictError(active)
+            self.jobs[job.id] = job
+            self._prune()
+        self.executor.submit(self._run, job, fn, on_done)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def active_job(self, table_name):
+        """The queued or running job for `table_name`, if any; call with the lock held."""
+        return next(
+            (
+                job
+                for job in self.jobs.values()
+                if job.table_name == table_name and job.status in ("queued", "running")
+            ),
+            None,
+        )
+
+    def _run(self, job, fn, on_done):
+        job.status = "running"
+        job.started_at = datetime.now()
+        try:
+            job.result = fn(job.progress)
+            job.status = "completed"
+        except Exception as e:
+            print(f"Ingestion job {job.id} failed: {traceback.format_exc()}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.now()
+            if on_done:
+                try:
+                    on_done()
+                except Exception as cleanup_error:
+                    print(f"Error cleaning up job {job.id}: {cleanup_error}")
+
+    def _prune(self):
+        finished = [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job.status in ("completed", "failed")
+        ]
+        excess = len(self.jobs) - self.history
+        for job_id in finished[: max(0, excess)]:
+            del self.jobs[job_id]
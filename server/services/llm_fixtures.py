@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "off", "record" (call the model and save every prompt/response pair),
+# "replay" (serve saved responses, call the model for unknown prompts) or
+# "strict" (serve saved responses, fail on unknown prompts)
+LLM_FIXTURE_MODE = os.getenv("LLM_FIXTURE_MODE", "off").lower()
+LLM_FIXTURE_PATH = os.getenv(
+    "LLM_FIXTURE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "fixtures", "llm_fixtures.jsonl"),
+)
+# "recorded" replays the latency each call had when it was recorded; a number
+# replays every call with that many seconds
+LLM_FIXTURE_LATENCY = os.getenv("LLM_FIXTURE_LATENCY", "recorded")
+
+FIXTURE_MODES = ("off", "record", "replay", "strict")
+
+
+class MissingFixtureError(Exception):
+    pass
+
+
+class LLMFixtureStore:
+    """
+    Prompt/response pairs kept in a JSON-lines file, keyed by a hash of the
+    request. Recording appends; the last entry for a key wins on load.
+    """
+
+    def __init__(self, path=LLM_FIXTURE_PATH, mode=LLM_FIXTURE_MODE, latency=LLM_FIXTURE_LATENCY):
+        if mode not in FIXTURE_MODES:
+            raise ValueError(f"LLM_FIXTURE_MODE must be one of {', '.join(FIXTURE_MODES)}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._entries = self._load() if mode in ("replay", "strict") else {}
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    @property
+    def recording(self):
+        return self.mode == "record"
+
+    @property
+    def replaying(self):
+        return self.mode in ("replay", "strict")
+
+    def _load(self):
+        entries = {}
+        if not os.path.exists(self.path):
+            print(f"No LLM fixture file at {self.path}")
+            return entries
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries[entry["key"]] = entry
+        print(f"Loaded {len(entries)} LLM fixtures from {self.path}")
+        return entries
+
+    def key_for(self, payload):
+        return hashlib.sha256(
+            json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def lookup(self, key, call_site):
+        """
+        Returns the recorded response after sleeping for its replay latency.
+        Returns None for an unknown key, or raises MissingFixtureError in strict mode.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            if self.mode == "strict":
+                raise MissingFixtureError(
+                    f"No recorded LLM response for call site '{call_site}' (key {key[:12]})"
+                )
+            return None
+        delay = self.replay_latency(entry)
+        if delay > 0:
+            time.sleep(delay)
+        return entry["response"]
+
+    def replay_latency(self, entry):
+        if self.latency == "recorded":
+            return entry.get("latency", 0)
+        return float(self.latency)
+
+    def record(self, key, call_site, request, response, latency):
+        entry = {
+            "key": key,
+            "call_site": call_site,
+            "request": request,
+            "response": response,
+            "latency": round(latency, 4),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+
+
+def langchain_fixture_cache(store):
+    """
+    Builds a langchain cache over `store`, so chat models driven by langchain
+    (the SQL agent) are recorded and replayed like the gateway's own calls.
+    """
+    from langchain_core.caches import BaseCache
+    from langchain_core.load import dumps, loads
+
+    class FixtureCache(BaseCache):
+        def __init__(self):
+            # langchain does not report a call's latency to the cache, so a
+            # recorded call is timed from its cache miss to its update
+            self._started = {}
+
+        def lookup(self, prompt, llm_string):
+            key = store.key_for({"prompt": prompt, "llm": llm_string})
+            if store.recording:
+                self._started[key] = time.perf_counter()
+            if not store.replaying:
+                return None
+            response = store.lookup(key, "sql_agent")
+            return loads(response) if response is not None else None
+
+        def update(self, prompt, llm_string, return_val):
+            if store.recording:
+                key = store.key_for({"prompt": prompt, "llm": llm_string})
+                started = self._started.pop(key, None)
+                latency = time.perf_counter() - started if started is not None else 0
+                store.record(key, "sql_agent", {"prompt": prompt}, dumps(return_val), latency)
+
+        def clear(self, **kwargs):
+            pass
+
+    return FixtureCache()
+
+
+llm_fixtures = LLMFixtureStore()
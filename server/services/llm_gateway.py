@@ -0,0 +1,315 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import litellm
+from dotenv import load_dotenv
+
+from services.rate_limiter import llm_rate_limiter
+from services.metrics import metrics, LLM_REQUEST_SECONDS, LLM_TOKENS
+from services.llm_fixtures import llm_fixtures
+
+load_dotenv()
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini/gemini-2.0-flash")
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "cache", "llm_cache.sqlite3"),
+)
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 24 * 60 * 60))
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", 1024))
+# output tokens reserved per call when charging the tokens-per-minute budget
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", 512))
+
+
+class LLMResponseCache:
+    """
+    Two-tier response cache: an in-memory LRU in front of a SQLite table. Entries
+    expire after `ttl` seconds in both tiers; expired disk rows are purged as
+    they are found and in bulk every few hundred writes.
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_items=LLM_CACHE_MEMORY_ITEMS):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """
+        )
+        self._db.commit()
+
+    def get(self, key):
+        """Returns (response, tier) where tier is "memory", "disk" or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    return entry[0], "memory"
+                del self._memory[key]
+
+            row = self._db.execute(
+                "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None, None
+            if row[1] <= now:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None, None
+            self._remember(key, row[0], row[1])
+            return row[0], "disk"
+
+    def put(self, key, response):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, response, expires_at)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, response, expires_at),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _remember(self, key, response, expires_at):
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+
+class LLMGateway:
+    """
+    Single entry point for text completions. Every call site goes through
+    `complete`, which adds the response cache and per-call-site accounting.
+    With LLM_FIXTURE_MODE set, calls are recorded to or replayed from the
+    fixture file instead, and the response cache is bypassed.
+    """
+
+    def __init__(self, model=LLM_MODEL, cache_enabled=LLM_CACHE_ENABLED):
+        self.model = model
+        self.cache = LLMResponseCache() if cache_enabled else None
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _cache_key(self, model, messages, temperature):
+        payload = json.dumps(
+            {"model": model, "messages": messages, "temperature": temperature},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _estimate_tokens(self, messages):
+        prompt_chars = sum(len(str(message.get("content") or "")) for message in messages)
+        return prompt_chars // 4 + LLM_EXPECTED_OUTPUT_TOKENS
+
+    def _record_usage(self, call_site, messages, response, content):
+        usage = getattr(response, "usage", None)
+        tokens_in = getattr(usage, "prompt_tokens", None)
+        tokens_out = getattr(usage, "completion_tokens", None)
+        if tokens_in is None:
+            tokens_in = self._estimate_tokens(messages) - LLM_EXPECTED_OUTPUT_TOKENS
+        if tokens_out is None:
+            tokens_out = len(content or "") // 4
+        LLM_TOKENS.inc(tokens_in, call_site=call_site, direction="in")
+        LLM_TOKENS.inc(tokens_out, call_site=call_site, direction="out")
+
+    def _account(self, call_site, outcome):
+        with self._lock:
+            stats = self._stats.setdefault(
+                call_site,
+                {"calls": 0, "memory_hits": 0, "disk_hits": 0, "fixture_hits": 0, "misses": 0},
+            )
+            stats["calls"] += 1
+            stats[outcome] += 1
+
+    def complete(
+        self,
+        prompt=None,
+        messages=None,
+        model=None,
+        temperature=None,
+        call_site="default",
+        cache=True,
+    ):
+        """Returns the completion text for `prompt` (or a full `messages` list)."""
+        started = time.perf_counter()
+        model = model or self.model
+        if messages is None:
+            messages = [{"role": "user", "content": prompt}]
+
+        if llm_fixtures.replaying:
+            response = llm_fixtures.lookup(
+                self._cache_key(model, messages, temperature), call_site
+            )
+            if response is not None:
+                self._account(call_site, "fixture_hits")
+                LLM_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, call_site=call_site, cache="fixture"
+                )
+                return response
+
+        key = None
+        if cache and self.cache and not llm_fixtures.enabled:
+            key = self._cache_key(model, messages, temperature)
+            response, tier = self.cache.get(key)
+            if response is not None:
+                self._account(call_site, f"{tier}_hits")
+                LLM_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, call_site=call_site, cache=tier
+                )
+                return response
+
+        kwargs = {}
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        response = llm_rate_limiter.call(
+            lambda: litellm.completion(
+                model=model,
+                messages=messages,
+                api_key=os.getenv("GOOGLE_API_KEY"),
+                **kwargs,
+            ),
+            tokens=self._estimate_tokens(messages),
+        )
+        content = response.choices[0].message.content
+        self._account(call_site, "misses")
+        self._record_usage(call_site, messages, response, content)
+        elapsed = time.perf_counter() - started
+        LLM_REQUEST_SECONDS.observe(elapsed, call_site=call_site, cache="miss")
+        if llm_fixtures.recording:
+            self._record_fixture(model, messages, temperature, call_site, content, elapsed)
+
+        if key and content:
+            self.cache.put(key, content)
+        return content
+
+    def stream(
+        self,
+        prompt=None,
+        messages=None,
+        model=None,
+        temperature=None,
+        call_site="default",
+        cache=True,
+    ):
+        """Like `complete`, but yields the text in chunks as the model produces it."""
+        started = time.perf_counter()
+        model = model or self.model
+        if messages is None:
+            messages = [{"role": "user", "content": prompt}]
+
+        if llm_fixtures.replaying:
+            response = llm_fixtures.lookup(
+                self._cache_key(model, messages, temperature), call_site
+            )
+            if response is not None:
+                self._account(call_site, "fixture_hits")
+                LLM_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, call_site=call_site, cache="fixture"
+                )
+                yield response
+                return
+
+        key = None
+        if cache and self.cache and not llm_fixtures.enabled:
+            key = self._cache_key(model, messages, temperature)
+            response, tier = self.cache.get(key)
+            if response is not None:
+                self._account(call_site, f"{tier}_hits")
+                LLM_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, call_site=call_site, cache=tier
+                )
+                yield response
+                return
+
+        kwargs = {}
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        chunks = []
+        # the slot is held until the stream is drained; only opening it is retried
+        with llm_rate_limiter.slot(self._estimate_tokens(messages)):
+            response = llm_rate_limiter.retry(
+                lambda: litellm.completion(
+                    model=model,
+                    messages=messages,
+                    api_key=os.getenv("GOOGLE_API_KEY"),
+                    stream=True,
+                    **kwargs,
+                )
+            )
+            for chunk in response:
+                text = chunk.choices[0].delta.content
+                if text:
+                    chunks.append(text)
+                    yield text
+        self._account(call_site, "misses")
+
+        content = "".join(chunks)
+        self._record_usage(call_site, messages, None, content)
+        elapsed = time.perf_counter() - started
+        LLM_REQUEST_SECONDS.observe(elapsed, call_site=call_site, cache="miss")
+        if llm_fixtures.recording:
+            self._record_fixture(model, messages, temperature, call_site, content, elapsed)
+        if key and content:
+            self.cache.put(key, content)
+
+    def _record_fixture(self, model, messages, temperature, call_site, content, elapsed):
+        llm_fixtures.record(
+            self._cache_key(model, messages, temperature),
+            call_site,
+            {"model": model, "messages": messages, "temperature": temperature},
+            content,
+            elapsed,
+        )
+
+    def stats(self):
+        with self._lock:
+            return {call_site: dict(stats) for call_site, stats in self._stats.items()}
+
+
+llm_gateway = LLMGateway()
+
+
+def _gateway_metrics():
+    stats = llm_gateway.stats()
+    return [
+        (
+            "llm_cache_lookups",
+            "LLM calls by call site and outcome (memory_hits, disk_hits, fixture_hits, misses).",
+            [
+                ({"call_site": call_site, "outcome": outcome}, site_stats[outcome])
+                for call_site, site_stats in stats.items()
+                for outcome in ("memory_hits", "disk_hits", "fixture_hits", "misses")
+            ],
+        )
+    ]
+
+
+metrics.register_collector(_gateway_metrics)
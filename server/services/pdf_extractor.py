@@ -0,0 +1,132 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from PyPDF2 import PdfReader
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf
+    except ImportError:
+        pymupdf = None
+
+# 0 parses in the calling thread instead of a process pool
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", os.cpu_count() or 2))
+PDF_EXTRACT_TIMEOUT = float(os.getenv("PDF_EXTRACT_TIMEOUT", 60))
+# forking a process that already runs grpc and thread pools can deadlock the child
+PDF_START_METHOD = os.getenv("PDF_START_METHOD", "spawn")
+# separates pages in extracted text, so page headers and footers can be recognised
+PAGE_BREAK = "\f"
+
+
+def extract_pdf_text(file_path):
+    """Extracts the text of one PDF, preferring PyMuPDF and falling back to PyPDF2."""
+    started = time.perf_counter()
+    if pymupdf is not None:
+        try:
+            with pymupdf.open(file_path) as doc:
+                text = PAGE_BREAK.join(page.get_text() for page in doc)
+                return {
+                    "text": text,
+                    "engine": "pymupdf",
+                    "pages": doc.page_count,
+                    "seconds": time.perf_counter() - started,
+                }
+        except Exception as e:
+            print(f"PyMuPDF failed on {file_path}, falling back to PyPDF2: {e}")
+
+    pdf_reader = PdfReader(file_path)
+    text = PAGE_BREAK.join(page.extract_text() or "" for page in pdf_reader.pages)
+    return {
+        "text": text,
+        "engine": "pypdf2",
+        "pages": len(pdf_reader.pages),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+class PdfExtractor:
+    """
+    Runs PDF text extraction on a process pool so parsing scales across cores and
+    does not hold the GIL of the request/ingestion threads. A broken pool is
+    replaced and the extraction retried; a worker stuck past `timeout` is killed
+    by replacing the pool.
+    """
+
+    def __init__(self, workers=PDF_WORKERS, timeout=PDF_EXTRACT_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(PDF_START_METHOD),
+                )
+            return self._pool
+
+    def _replace_pool(self, pool, kill=False):
+        """Drops `pool` so the next extraction starts a fresh one; `kill` stops its workers."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        if kill:
+            # the executor has no public way to stop a busy worker; the other
+            # extractions it was running fail with BrokenProcessPool and are retried
+            for process in list((pool._processes or {}).values()):
+                process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _extract_in_pool(self, file_path):
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                future = pool.submit(extract_pdf_text, file_path)
+            except RuntimeError:
+                # broken, or shut down by another thread that just replaced it
+                self._replace_pool(pool)
+                continue
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                if not future.cancel():
+                    print(f"PDF extraction of {file_path} hung, restarting the worker pool")
+                    self._replace_pool(pool, kill=True)
+                raise
+            except BrokenProcessPool:
+                print("PDF worker pool broke, restarting it")
+                self._replace_pool(pool)
+        raise Exception(f"PDF worker pool kept failing on {file_path}")
+
+    def extract(self, file_path):
+        """Returns {"text", "engine", "pages", "seconds"} for `file_path`."""
+        if self.workers > 0:
+            result = self._extract_in_pool(file_path)
+        else:
+            result = extract_pdf_text(file_path)
+        self._record(result)
+        return result
+
+    def _record(self, result):
+        with self._lock:
+            stats = self._stats.setdefault(
+                result["engine"], {"documents": 0, "pages": 0, "total_seconds": 0.0}
+            )
+            stats["documents"] += 1
+            stats["pages"] += result["pages"]
+            stats["total_seconds"] += result["seconds"]
+
+    def stats(self):
+        with self._lock:
+            return {engine: dict(stats) for engine, stats in self._stats.items()}
+
+
+pdf_extractor = PdfExtractor()
@@ -0,0 +1,96 @@
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+PRESCREEN_THRESHOLD = float(os.getenv("PRESCREEN_THRESHOLD", 0))
+PRESCREEN_K1 = float(os.getenv("PRESCREEN_K1", 1.2))
+PRESCREEN_B = float(os.getenv("PRESCREEN_B", 0.75))
+PRESCREEN_AVG_DOC_TOKENS = float(os.getenv("PRESCREEN_AVG_DOC_TOKENS", 600))
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+
+STOP_WORDS = {
+    "a", "about", "above", "after", "all", "also", "an", "and", "any", "are", "as",
+    "at", "be", "been", "being", "both", "but", "by", "can", "candidate", "company",
+    "could", "do", "does", "during", "each", "etc", "experience", "for", "from",
+    "good", "has", "have", "having", "he", "her", "his", "how", "i", "if", "in",
+    "into", "is", "it", "its", "job", "looking", "may", "me", "more", "must", "my",
+    "new", "not", "of", "on", "or", "other", "our", "over", "plus", "preferred",
+    "required", "requirements", "responsibilities", "role", "she", "should", "skills",
+    "so", "strong", "such", "team", "than", "that", "the", "their", "them", "then",
+    "there", "these", "they", "this", "those", "through", "to", "under", "up", "us",
+    "using", "various", "very", "was", "we", "well", "were", "what", "when", "where",
+    "which", "while", "who", "will", "with", "within", "work", "working", "would",
+    "year", "years", "you", "your",
+}
+
+
+def tokenize(text):
+    tokens = TOKEN_PATTERN.findall((text or "").lower())
+    return [token for token in tokens if token not in STOP_WORDS and len(token) > 1]
+
+
+class Prescreener:
+    """
+    Cheap lexical match between one JD and many resumes, used to keep obvious
+    non-matches away from the LLM. The JD's terms (unigrams and bigrams) form the
+    query; each resume gets a BM25 score over those terms normalised to 0-100,
+    where 100 means every JD term appears often enough to saturate.
+    """
+
+    def __init__(
+        self,
+        jd_text,
+        threshold=PRESCREEN_THRESHOLD,
+        k1=PRESCREEN_K1,
+        b=PRESCREEN_B,
+        avg_doc_tokens=PRESCREEN_AVG_DOC_TOKENS,
+    ):
+        self.threshold = threshold
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_tokens = avg_doc_tokens
+
+        jd_counts = Counter(self._terms(tokenize(jd_text)))
+        self.vocabulary = {term: i for i, term in enumerate(jd_counts)}
+        # terms the JD repeats weigh more, bigrams (e.g. "machine learning") more still
+        self.weights = np.array(
+            [
+                (1.0 + math.log(count)) * (1.5 if " " in term else 1.0)
+                for term, count in jd_counts.items()
+            ],
+            dtype=np.float64,
+        )
+        self.max_score = float(self.weights.sum() * (self.k1 + 1))
+
+    @property
+    def enabled(self):
+        return self.threshold > 0 and self.max_score > 0
+
+    def _terms(self, tokens):
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def score(self, resume_text):
+        if not self.max_score:
+            return 0.0
+        tokens = tokenize(resume_text)
+        indexes = np.fromiter(
+            (
+                self.vocabulary[term]
+                for term in self._terms(tokens)
+                if term in self.vocabulary
+            ),
+            dtype=np.int64,
+        )
+        tf = np.bincount(indexes, minlength=len(self.vocabulary)).astype(np.float64)
+        length_norm = self.k1 * (
+            1 - self.b + self.b * max(len(tokens), 1) / self.avg_doc_tokens
+        )
+        bm25 = self.weights * tf * (self.k1 + 1) / (tf + length_norm)
+        return round(float(bm25.sum()) / self.max_score * 100, 2)
+
+    def passes(self, score):
+        return not self.enabled or score >= self.threshold
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from services.llm_gateway import llm_gateway
+
+# Token budgets for each kind of text embedded in a prompt; override with e.g.
+# PROMPT_BUDGET_RESUME=4000. 0 disables compaction for that kind.
+DEFAULT_PROMPT_BUDGETS = {
+    "jd": 3000,
+    "resume": 6000,
+    "candidate": 1500,
+    "history": 2000,
+    "answer": 2000,
+    "search_results": 8000,
+    "sql_rows": 6000,
+}
+PROMPT_SUMMARY_CACHE_ITEMS = int(os.getenv("PROMPT_SUMMARY_CACHE_ITEMS", 256))
+
+SECTION_HEADINGS = re.compile(
+    r"^(about( the)? (role|company|us)|summary|profile|objective|experience|work experience|"
+    r"employment|professional experience|projects?|skills|technical skills|education|"
+    r"certifications?|achievements|awards|publications|responsibilities|requirements|"
+    r"qualifications|what you('ll| will) do|who you are|nice to have|benefits|perks)\s*:?$",
+    re.IGNORECASE,
+)
+# Sections that get a bigger share of the budget when a document must be cut
+PRIORITY_SECTIONS = re.compile(
+    r"skills|experience|employment|projects|responsibilities|requirements|qualifications|what you",
+    re.IGNORECASE,
+)
+BOILERPLATE_LINES = re.compile(
+    r"^(curriculum vitae|resume|references( available)?( upon request)?\.?"
+    r"|equal opportunity employer.*|[\W_]+)$",
+    re.IGNORECASE,
+)
+# only dropped where a page starts or ends
+PAGE_NUMBER_LINES = re.compile(r"^(page \d+( of \d+)?|\d+ ?/ ?\d+|\d+)$", re.IGNORECASE)
+# pdf_extractor separates pages with a form feed
+PAGE_BREAK = "\f"
+
+
+def count_tokens(text):
+    # ~4 characters per token is close enough for sizing Gemini prompts
+    return len(text or "") // 4 + 1
+
+
+def prompt_budget(kind):
+    return int(os.getenv(f"PROMPT_BUDGET_{kind.upper()}", DEFAULT_PROMPT_BUDGETS.get(kind, 4000)))
+
+
+def _page_edges(page):
+    """Indexes of the first and last non-empty line of a page."""
+    filled = [i for i, line in enumerate(page) if line]
+    return {filled[0], filled[-1]} if filled else set()
+
+
+def clean_text(text):
+    """
+    Collapses whitespace and drops separators, plus page numbers and headers or
+    footers repeated at the top or bottom of several pages. Lines inside a page
+    are never dropped for repeating, so repeated job titles or companies stay.
+    """
+    pages = [
+        [re.sub(r"[ \t ]+", " ", line).strip() for line in page.splitlines()]
+        for page in (text or "").split(PAGE_BREAK)
+    ]
+    edges = [_page_edges(page) for page in pages]
+    repeated = set()
+    if len(pages) > 1:
+        edge_counts = Counter(
+            line for page, indexes in zip(pages, edges) for line in {page[i] for i in indexes}
+        )
+        repeated = {line for line, count in edge_counts.items() if count >= 2 and len(line) < 80}
+
+    cleaned, seen_edges = [], set()
+    for page, indexes in zip(pages, edges):
+        for i, line in enumerate(page):
+            if line and BOILERPLATE_LINES.match(line):
+                continue
+            if i in indexes:
+                # the first copy of a running header is often the real title or name
+                if PAGE_NUMBER_LINES.match(line) or line in seen_edges:
+                    continue
+                if line in repeated:
+                    seen_edges.add(line)
+            if not line and (not cleaned or not cleaned[-1]):
+                continue
+            cleaned.append(line)
+    return "\n".join(cleaned).strip()
+
+
+def split_sections(text):
+    """Returns [(heading, body_lines)]; text before the first heading has heading None."""
+    sections = [(None, [])]
+    for line in text.splitlines():
+        if len(line) < 60 and SECTION_HEADINGS.match(line.strip("#*: ")):
+            sections.append((line, []))
+        else:
+            sections[-1][1].append(line)
+    return [(heading, body) for heading, body in sections if heading or any(body)]
+
+
+def _truncate_lines(lines, budget):
+    kept, used = [], 0
+    for line in lines:
+        tokens = count_tokens(line)
+        if used + tokens > budget:
+            remaining = (budget - used) * 4
+            if remaining > 40:
+                kept.append(line[:remaining].rstrip() + " ...")
+            kept.append("[...]")
+            break
+        kept.append(line)
+        used += tokens
+    return kept
+
+
+def truncate_sections(text, budget):
+    """
+    Cuts `text` down to about `budget` tokens while keeping every section heading.
+    Sections share the budget (priority sections count double); short sections
+    are kept whole and whatever they leave unused goes to the longer ones.
+    """
+    if count_tokens(text) <= budget:
+        return text
+    sections = split_sections(text)
+    sizes = [count_tokens("\n".join(body)) for _, body in sections]
+    weights = [
+        2 if heading and PRIORITY_SECTIONS.search(heading) else 1
+        for heading, _ in sections
+    ]
+
+    allowance = [0] * len(sections)
+    pending = set(range(len(sections)))
+    remaining = budget - sum(count_tokens(heading) for heading, _ in sections if heading)
+    while pending and remaining > 0:
+        total_weight = sum(weights[i] for i in pending)
+        fits = [
+            i for i in pending if sizes[i] <= remaining * weights[i] / total_weight
+        ]
+        if not fits:
+            for i in pending:
+                allowance[i] = int(remaining * weights[i] / total_weight)
+            break
+        for i in fits:
+            allowance[i] = sizes[i]
+            remaining -= sizes[i]
+            pending.discard(i)
+
+    out = []
+    for (heading, body), size, allowed in zip(sections, sizes, allowance):
+        if heading:
+            out.append(heading)
+        out.extend(body if size <= allowed else _truncate_lines(body, allowed))
+    return "\n".join(out)
+
+
+def prune_empty(data):
+    """Drops None, empty strings, lists and dicts from nested JSON-like data."""
+    if isinstance(data, dict):
+        pruned = {key: prune_empty(value) for key, value in data.items()}
+        return {key: value for key, value in pruned.items() if value not in (None, "", [], {})}
+    if isinstance(data, list):
+        pruned = [prune_empty(value) for value in data]
+        return [value for value in pruned if value not in (None, "", [], {})]
+    return data
+
+
+def _cap_lists(data, max_items):
+    if isinstance(data, dict):
+        return {key: _cap_lists(value, max_items) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_cap_lists(value, max_items) for value in data[:max_items]]
+    return data
+
+
+class PromptCompactor:
+    """
+    Shrinks documents before they are embedded in a prompt: cleans them, then
+    either swaps them for a cached LLM summary or truncates them section by
+    section to the budget for their kind.
+    """
+
+    def __init__(self, max_summaries=PROMPT_SUMMARY_CACHE_ITEMS):
+        self.max_summaries = max_summaries
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compact(self, text, kind, summarize=False):
+        """Returns `text` fitted to the `kind` budget; `summarize` allows an LLM summary."""
+        if not text:
+            return text or ""
+        budget = prompt_budget(kind)
+        if not budget or count_tokens(text) <= budget:
+            return text
+        text = clean_text(text)
+        if count_tokens(text) <= budget:
+            return text
+        if summarize:
+            try:
+                return self.summarize(text, kind, budget)
+            except Exception as e:
+                print(f"Summarizing {kind} failed, truncating instead: {e}")
+        return truncate_sections(text, budget)
+
+    def summarize(self, text, kind, budget):
+        key = hashlib.sha256(f"{kind}\0{budget}\0{text}".encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._summaries:
+                self._summaries.move_to_end(key)
+                return self._summaries[key]
+
+        words = max(100, budget * 3 // 4)
+        prompt = f"""
+        Condense the following {kind.replace("_", " ")} to at most {words} words.
+        Keep every concrete fact: names, titles, skills, technologies, years of experience,
+        requirements, locations, companies, degrees and contact details. Drop filler text.
+        Return only the condensed text.
+
+        {text}
+        """
+        summary = llm_gateway.complete(prompt, call_site="document_summary").strip()
+        if count_tokens(summary) > budget:
+            summary = truncate_sections(summary, budget)
+
+        with self._lock:
+            self._summaries[key] = summary
+            while len(self._summaries) > self.max_summaries:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def compact_history(self, turns, kind="history"):
+        """
+        Formats (question, answer) pairs, oldest first, keeping the most recent
+        turns that fit the budget and trimming long answers.
+        """
+        budget = prompt_budget(kind)
+        per_answer = max(200, budget // 4) if budget else 0
+        lines, used = [], 0
+        for question, answer in reversed(list(turns)):
+            answer = clean_text(str(answer))
+            if per_answer and count_tokens(answer) > per_answer:
+                answer = truncate_sections(answer, per_answer)
+            line = f"User: {question}\nBot: {answer}"
+            if budget and lines and used + count_tokens(line) > budget:
+                break
+            lines.append(line)
+            used += count_tokens(line)
+        return "\n".join(reversed(lines))
+
+    def compact_json(self, data, kind):
+        """Serializes `data` without empty fields, capping list lengths until it fits."""
+        budget = prompt_budget(kind)
+        data = prune_empty(data)
+        text = json.dumps(data, separators=(",", ":"), default=str)
+        for max_items in (20, 10, 5, 3, 1):
+            if not budget or count_tokens(text) <= budget:
+                return text
+            text = json.dumps(_cap_lists(data, max_items), separators=(",", ":"), default=str)
+        if count_tokens(text) > budget:
+            text = text[: budget * 4] + " ...[truncated]"
+        return text
+
+
+prompt_compactor = PromptCompactor()
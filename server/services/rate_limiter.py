@@ -0,0 +1,280 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from services.metrics import metrics
+
+# 0 turns the corresponding limit off
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 1000))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", 1000000))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", 1))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 5))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 1.0))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 30.0))
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {
+    "RateLimitError",
+    "ServiceUnavailableError",
+    "InternalServerError",
+    "APIConnectionError",
+    "Timeout",
+    "APITimeoutError",
+    "ResourceExhausted",
+    "ServiceUnavailable",
+}
+
+
+def is_rate_limited(error):
+    return (
+        getattr(error, "status_code", None) == 429
+        or type(error).__name__ in ("RateLimitError", "ResourceExhausted")
+    )
+
+
+def is_retryable(error):
+    return (
+        getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+        or type(error).__name__ in RETRYABLE_ERROR_NAMES
+    )
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to one minute's worth of `per_minute`."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, amount):
+        """Takes `amount` if available and returns 0, otherwise returns seconds to wait."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0
+            return (amount - self.tokens) / self.rate
+
+    def give_back(self, amount):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdaptiveRateLimiter:
+    """
+    Process-wide limiter shared by every LLM call. Requests wait for a
+    concurrency slot, then for the requests-per-minute and tokens-per-minute
+    buckets. The concurrency limit grows additively on success and halves on a
+    429 (AIMD), so throughput settles just under the provider quota.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        min_concurrency=LLM_MIN_CONCURRENCY,
+        max_retries=LLM_MAX_RETRIES,
+        backoff_base=LLM_BACKOFF_BASE,
+        backoff_max=LLM_BACKOFF_MAX,
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._condition = threading.Condition()
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._last_decrease = 0.0
+        self._stats = {
+            "requests": 0,
+            "throttled": 0,
+            "retries": 0,
+            "failures": 0,
+            "max_queue_depth": 0,
+            "total_wait_seconds": 0.0,
+        }
+
+    def _wait_for_buckets(self, tokens):
+        while True:
+            wait = self.request_bucket.take(1) if self.request_bucket else 0
+            if not wait and self.token_bucket:
+                wait = self.token_bucket.take(tokens)
+                if wait and self.request_bucket:
+                    # give the request back, it is retaken with the tokens
+                    self.request_bucket.give_back(1)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def acquire(self, tokens=0):
+        """Waits for a concurrency slot and the bucket budget; pair with `release`."""
+        started = time.monotonic()
+        with self._condition:
+            self._waiting += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._waiting)
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._waiting -= 1
+            self._in_flight += 1
+        try:
+            self._wait_for_buckets(tokens)
+            with self._condition:
+                self._stats["requests"] += 1
+                self._stats["total_wait_seconds"] += time.monotonic() - started
+        except BaseException:
+            self.release(None)
+            raise
+
+    @contextmanager
+    def slot(self, tokens=0):
+        """Holds one concurrency slot (and the bucket budget) for the `with` body."""
+        self.acquire(tokens)
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.release(error)
+
+    def release(self, error=None):
+        """Frees a slot taken by `acquire`; `error` is the call's exception, if any."""
+        with self._condition:
+            self._in_flight -= 1
+            if error is not None and is_rate_limited(error):
+                self._decrease()
+            elif error is None:
+                self._limit = min(self.max_concurrency, self._limit + 1.0 / self._limit)
+            self._condition.notify_all()
+
+    def _decrease(self):
+        # one halving per burst of 429s, not one per failed request
+        now = time.monotonic()
+        self._stats["throttled"] += 1
+        if now - self._last_decrease > 1.0:
+            self._limit = max(self.min_concurrency, self._limit / 2)
+            self._last_decrease = now
+
+    def backoff(self, attempt):
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def retry(self, fn):
+        """Calls `fn()` with backoff on retryable errors, without taking a slot."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return fn()
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    with self._condition:
+                        self._stats["failures"] += 1
+                    raise
+                with self._condition:
+                    self._stats["retries"] += 1
+                    if is_rate_limited(e):
+                        self._decrease()
+                delay = self.backoff(attempt)
+                print(f"LLM call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def call(self, fn, tokens=0):
+        """Runs `fn()` inside a slot, retrying retryable errors with backoff."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.slot(tokens):
+                    return fn()
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    with self._condition:
+                        self._stats["failures"] += 1
+                    raise
+                with self._condition:
+                    self._stats["retries"] += 1
+                delay = self.backoff(attempt)
+                print(f"LLM call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def stats(self):
+        with self._condition:
+            return {
+                **self._stats,
+                "queue_depth": self._waiting,
+                "in_flight": self._in_flight,
+                "concurrency_limit": int(self._limit),
+            }
+
+
+def langchain_rate_limit_callback(limiter):
+    """
+    Builds a langchain callback that holds a `limiter` slot for every model call
+    it sees, so langchain-driven models (the SQL agent) share the gateway's limits.
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class RateLimitCallback(BaseCallbackHandler):
+        def __init__(self):
+            self._runs = set()
+
+        def _start(self, run_id, text_length):
+            limiter.acquire(text_length // 4)
+            self._runs.add(run_id)
+
+        def _end(self, run_id, error=None):
+            if run_id in self._runs:
+                self._runs.discard(run_id)
+                limiter.release(error)
+
+        def on_chat_model_start(self, serialized, messages, run_id=None, **kwargs):
+            self._start(
+                run_id, sum(len(str(m.content)) for batch in messages for m in batch)
+            )
+
+        def on_llm_start(self, serialized, prompts, run_id=None, **kwargs):
+            self._start(run_id, sum(len(prompt) for prompt in prompts))
+
+        def on_llm_end(self, response, run_id=None, **kwargs):
+            self._end(run_id)
+
+        def on_llm_error(self, error, run_id=None, **kwargs):
+            self._end(run_id, error)
+
+    return RateLimitCallback()
+
+
+llm_rate_limiter = AdaptiveRateLimiter()
+
+
+def _limiter_metrics():
+    stats = llm_rate_limiter.stats()
+    return [
+        (f"llm_limiter_{name}", help, [({}, stats[name])])
+        for name, help in (
+            ("queue_depth", "LLM calls waiting for a limiter slot."),
+            ("max_queue_depth", "Deepest the limiter queue has been."),
+            ("in_flight", "LLM calls currently holding a limiter slot."),
+            ("concurrency_limit", "Current AIMD concurrency limit."),
+            ("throttled", "429 responses seen."),
+            ("retries", "LLM calls retried after a retryable error."),
+            ("failures", "LLM calls that failed after retries."),
+            ("total_wait_seconds", "Total time calls spent waiting in the limiter."),
+        )
+    ]
+
+
+metrics.register_collector(_limiter_metrics)
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+RESUME_CACHE_DIR = os.getenv(
+    "RESUME_CACHE_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "cache", "resumes"),
+)
+RESUME_CACHE_MAX_BYTES = int(os.getenv("RESUME_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# how long a URL is trusted to still serve the same PDF before it is downloaded again
+RESUME_URL_TTL = float(os.getenv("RESUME_URL_TTL", 24 * 60 * 60))
+
+
+def _sha256(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResumeCache:
+    """
+    On-disk cache of resume PDFs and their extracted text.
+
+    Layout under the cache dir:
+        urls/<sha256(url)>      -> content hash of the PDF last seen at that URL
+                                   and when it was downloaded
+        pdf/<content hash>.pdf  -> raw PDF bytes
+        text/<content hash>.txt -> extracted text
+    The same resume behind two URLs is stored and parsed once. A URL mapping
+    expires `url_ttl` seconds after its download, so a resume replaced at the
+    same link is fetched again. Entries are evicted least-recently-used first
+    once the total size exceeds `max_bytes`.
+    """
+
+    def __init__(
+        self, cache_dir=RESUME_CACHE_DIR, max_bytes=RESUME_CACHE_MAX_BYTES, url_ttl=RESUME_URL_TTL
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.url_ttl = url_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self.hits = {"url": 0, "pdf": 0, "text": 0}
+        self.misses = {"url": 0, "pdf": 0, "text": 0}
+        for sub in ("urls", "pdf", "text"):
+            os.makedirs(os.path.join(cache_dir, sub), exist_ok=True)
+        self._load_entries()
+
+    def _load_entries(self):
+        files = []
+        for sub in ("urls", "pdf", "text"):
+            folder = os.path.join(self.cache_dir, sub)
+            for name in os.listdir(folder):
+                path = os.path.join(folder, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(files):
+            self._entries[path] = size
+            self._size += size
+
+    def _url_path(self, url):
+        return os.path.join(self.cache_dir, "urls", _sha256(url))
+
+    def pdf_path(self, content_hash):
+        return os.path.join(self.cache_dir, "pdf", f"{content_hash}.pdf")
+
+    def _text_path(self, content_hash):
+        return os.path.join(self.cache_dir, "text", f"{content_hash}.txt")
+
+    def _touch(self, path):
+        if path in self._entries:
+            self._entries.move_to_end(path)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def _read(self, path, kind):
+        with self._lock:
+            if path not in self._entries or not os.path.exists(path):
+                self._forget(path)
+                self.misses[kind] += 1
+                return None
+            self._touch(path)
+            self.hits[kind] += 1
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def _write(self, path, write):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._forget(path)
+            self._entries[path] = size
+            self._size += size
+            self._evict()
+
+    def _forget(self, path):
+        size = self._entries.pop(path, None)
+        if size is not None:
+            self._size -= size
+
+    def _evict(self):
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def content_hash_for_url(self, url):
+        """Returns the content hash last downloaded from `url`, or None if unknown or expired."""
+        entry = self._read(self._url_path(url), "url")
+        if not entry:
+            return None
+        content_hash, _, fetched_at = entry.strip().partition("\n")
+        try:
+            expired = time.time() - float(fetched_at) > self.url_ttl
+        except ValueError:
+            # written before URL entries carried a download time
+            expired = True
+        if expired:
+            with self._lock:
+                self.hits["url"] -= 1
+                self.misses["url"] += 1
+            return None
+        return content_hash
+
+    def has_pdf(self, content_hash):
+        path = self.pdf_path(content_hash)
+        with self._lock:
+            if path in self._entries and os.path.exists(path):
+                self._touch(path)
+                self.hits["pdf"] += 1
+                return True
+            self._forget(path)
+            self.misses["pdf"] += 1
+            return False
+
+    def store_pdf(self, url, file_path):
+        """Copies a downloaded PDF into the cache and returns its content hash."""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+
+        if not os.path.exists(self.pdf_path(content_hash)):
+            self._write(
+                self.pdf_path(content_hash),
+                lambda tmp: shutil.copyfile(file_path, tmp),
+            )
+        self._write(
+            self._url_path(url),
+            lambda tmp: self._write_text(tmp, f"{content_hash}\n{time.time()}"),
+        )
+        return content_hash
+
+    def get_text(self, content_hash):
+        return self._read(self._text_path(content_hash), "text")
+
+    def store_text(self, content_hash, text):
+        self._write(self._text_path(content_hash), lambda tmp: self._write_text(tmp, text))
+
+    def _write_text(self, path, text):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+resume_cache = ResumeCache()
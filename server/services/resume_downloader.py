@@ -0,0 +1,180 @@
+import html
+import os
+import random
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DOWNLOAD_CONNECT_TIMEOUT = float(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", 5))
+DOWNLOAD_READ_TIMEOUT = float(os.getenv("DOWNLOAD_READ_TIMEOUT", 30))
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", 20 * 1024 * 1024))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", 3))
+DOWNLOAD_BACKOFF = float(os.getenv("DOWNLOAD_BACKOFF", 0.5))
+DOWNLOAD_PER_HOST = int(os.getenv("DOWNLOAD_PER_HOST", 4))
+DOWNLOAD_POOL_SIZE = int(os.getenv("DOWNLOAD_POOL_SIZE", 32))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+GOOGLE_DRIVE_DOWNLOAD_URL = "https://drive.google.com/uc"
+# Drive answers large files with an HTML "can't scan for viruses" page first
+DRIVE_PAGE_MAX_BYTES = 1024 * 1024
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class DownloadError(Exception):
+    pass
+
+
+class ResumeDownloader:
+    """
+    Streams resume PDFs to disk over one pooled keep-alive session. Each host gets
+    at most `per_host` concurrent downloads, every request has connect/read
+    timeouts, bodies above `max_bytes` are aborted, and transient failures are
+    retried with exponential backoff plus jitter. Google Drive files go through
+    the same session, following Drive's download confirmation page.
+    """
+
+    def __init__(
+        self,
+        connect_timeout=DOWNLOAD_CONNECT_TIMEOUT,
+        read_timeout=DOWNLOAD_READ_TIMEOUT,
+        max_bytes=DOWNLOAD_MAX_BYTES,
+        retries=DOWNLOAD_RETRIES,
+        backoff=DOWNLOAD_BACKOFF,
+        per_host=DOWNLOAD_PER_HOST,
+        pool_size=DOWNLOAD_POOL_SIZE,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_bytes = max_bytes
+        self.retries = retries
+        self.backoff = backoff
+        self.per_host = per_host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._host_slots = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def _sleep_before_retry(self, attempt):
+        delay = self.backoff * (2**attempt)
+        time.sleep(delay / 2 + random.uniform(0, delay / 2))
+
+    def download_google_drive(self, file_id, dest_path):
+        """Downloads a publicly shared Drive file into `dest_path`."""
+        return self.download(
+            GOOGLE_DRIVE_DOWNLOAD_URL, dest_path, params={"export": "download", "id": file_id}
+        )
+
+    def download(self, url, dest_path, params=None):
+        """Downloads `url` into `dest_path` and returns the number of bytes written."""
+        last_error = None
+        for attempt in range(self.retries + 1):
+            try:
+                with self._slot(url):
+                    return self._stream(url, dest_path, params)
+            except DownloadError:
+                raise
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                # a connection reset mid-body surfaces from iter_content as this
+                requests.exceptions.ChunkedEncodingError,
+            ) as e:
+                last_error = e
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code not in RETRYABLE_STATUS:
+                    raise DownloadError(f"Failed to download PDF: {e}")
+                last_error = e
+            if attempt < self.retries:
+                self._sleep_before_retry(attempt)
+        raise DownloadError(
+            f"Failed to download PDF after {self.retries + 1} attempts: {last_error}"
+        )
+
+    def _stream(self, url, dest_path, params=None, confirmed=False):
+        with self.session.get(
+            url, params=params, stream=True, timeout=self.timeout
+        ) as response:
+            response.raise_for_status()
+            if not self._is_drive_page(response):
+                return self._write_body(response, dest_path)
+            if confirmed:
+                raise DownloadError(
+                    "Google Drive returned a page instead of the file, is it shared publicly?"
+                )
+            url, params = self._drive_confirmation(response, params)
+        return self._stream(url, dest_path, params, confirmed=True)
+
+    def _is_drive_page(self, response):
+        host = urlparse(response.url).netloc.lower()
+        return host.endswith("google.com") and "text/html" in response.headers.get(
+            "Content-Type", ""
+        )
+
+    def _drive_confirmation(self, response, params):
+        """Returns the (url, params) that confirm a Drive download warning page."""
+        for name, value in response.cookies.items():
+            if name.startswith("download_warning"):
+                return response.url, {**(params or {}), "confirm": value}
+
+        page = b""
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            page += chunk
+            if len(page) > DRIVE_PAGE_MAX_BYTES:
+                break
+        page = page.decode("utf-8", errors="replace")
+
+        form = re.search(r'<form[^>]*id="download-form"[^>]*>', page)
+        action = form and re.search(r'action="([^"]+)"', form.group(0))
+        if action:
+            fields = re.findall(r'<input type="hidden" name="([^"]+)" value="([^"]*)"', page)
+            return html.unescape(action.group(1)), {
+                name: html.unescape(value) for name, value in fields
+            }
+        token = re.search(r"confirm=([0-9A-Za-z_-]+)", page)
+        if token:
+            return response.url, {**(params or {}), "confirm": token.group(1)}
+        raise DownloadError("Google Drive did not return the file, is it shared publicly?")
+
+    def _write_body(self, response, dest_path):
+        content_length = response.headers.get("Content-Length")
+        if content_length and int(content_length) > self.max_bytes:
+            raise DownloadError(
+                f"PDF is {content_length} bytes, limit is {self.max_bytes}"
+            )
+
+        written = 0
+        try:
+            with open(dest_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    written += len(chunk)
+                    if written > self.max_bytes:
+                        raise DownloadError(
+                            f"PDF exceeds the {self.max_bytes} byte limit"
+                        )
+                    f.write(chunk)
+        except Exception:
+            if os.path.exists(dest_path):
+                os.unlink(dest_path)
+            raise
+
+        if written == 0:
+            raise DownloadError("Downloaded PDF is empty")
+        return written
+
+
+resume_downloader = ResumeDownloader()
@@ -0,0 +1,88 @@
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import create_engine
+from langchain_community.utilities import SQLDatabase
+from langchain_community.agent_toolkits.sql.base import create_sql_agent
+from langchain_community.agent_toolkits import SQLDatabaseToolkit
+
+SQL_AGENT_CACHE_SIZE = int(os.getenv("SQL_AGENT_CACHE_SIZE", 32))
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", 5))
+SQL_POOL_MAX_OVERFLOW = int(os.getenv("SQL_POOL_MAX_OVERFLOW", 10))
+SQL_POOL_RECYCLE = int(os.getenv("SQL_POOL_RECYCLE", 1800))
+
+
+class SqlAgentCache:
+    """
+    Keeps one SQL agent per role table, least recently used evicted first. All
+    agents share one SQLAlchemy engine (and connection pool), so a cached table
+    costs neither a new engine nor another schema reflection per message.
+    """
+
+    def __init__(self, connection_string, llm, max_tables=SQL_AGENT_CACHE_SIZE):
+        self.engine = create_engine(
+            connection_string,
+            pool_size=SQL_POOL_SIZE,
+            max_overflow=SQL_POOL_MAX_OVERFLOW,
+            pool_recycle=SQL_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+        self.llm = llm
+        self.max_tables = max_tables
+        self._agents = OrderedDict()
+        self._build_locks = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _build(self, table_name):
+        db = SQLDatabase(self.engine, include_tables=[table_name])
+        toolkit = SQLDatabaseToolkit(db=db, llm=self.llm)
+        return create_sql_agent(
+            llm=self.llm,
+            toolkit=toolkit,
+            verbose=True,
+            agent_type="openai-tools",
+            handle_parsing_errors=True,
+        )
+
+    def get(self, table_name):
+        with self._lock:
+            agent = self._agents.get(table_name)
+            if agent is not None:
+                self._agents.move_to_end(table_name)
+                self.hits += 1
+                return agent
+            build_lock = self._build_locks.setdefault(table_name, threading.Lock())
+
+        # one build per table at a time; concurrent requests wait for it
+        with build_lock:
+            with self._lock:
+                agent = self._agents.get(table_name)
+                if agent is not None:
+                    self.hits += 1
+                    return agent
+                self.misses += 1
+                generation = self._generations.get(table_name, 0)
+            agent = self._build(table_name)
+            with self._lock:
+                if self._generations.get(table_name, 0) != generation:
+                    # invalidated while building: use it once, do not cache it
+                    return agent
+                self._agents[table_name] = agent
+                self._agents.move_to_end(table_name)
+                while len(self._agents) > self.max_tables:
+                    self._agents.popitem(last=False)
+            return agent
+
+    def invalidate(self, table_name):
+        """Drops the cached agent, e.g. after the table was rebuilt or altered."""
+        with self._lock:
+            self._agents.pop(table_name, None)
+            self._generations[table_name] = self._generations.get(table_name, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {"tables": len(self._agents), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import re
+import threading
+
+from services.llm_gateway import LLMResponseCache
+from services.metrics import metrics
+
+SQL_CACHE_ENABLED = os.getenv("SQL_CACHE_ENABLED", "1") == "1"
+SQL_CACHE_PATH = os.getenv(
+    "SQL_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "cache", "sql_cache.sqlite3"),
+)
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", 7 * 24 * 60 * 60))
+SQL_CACHE_MEMORY_ITEMS = int(os.getenv("SQL_CACHE_MEMORY_ITEMS", 512))
+
+FILLER_WORDS = {"please", "kindly", "can", "could", "you", "tell", "me", "the", "a", "an"}
+READ_ONLY_SQL = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+WRITE_KEYWORDS = re.compile(
+    r"\b(insert|update|delete|drop|alter|create|truncate|grant|revoke|copy)\b", re.IGNORECASE
+)
+
+
+def normalize_question(question):
+    """Lowercases, strips punctuation and filler words so rephrasings of one question match."""
+    words = re.findall(r"[a-z0-9@+#._'-]+", (question or "").lower())
+    return " ".join(word.strip("._'-") for word in words if word not in FILLER_WORDS)
+
+
+def is_read_only_sql(sql):
+    statement = (sql or "").strip().rstrip(";")
+    return (
+        bool(READ_ONLY_SQL.match(statement))
+        and ";" not in statement
+        and not WRITE_KEYWORDS.search(statement)
+    )
+
+
+class NlSqlCache:
+    """
+    Maps a normalized question plus the table's schema version to the SQL the
+    agent last executed successfully for it. A schema change produces a new
+    version and therefore new keys; stale entries simply age out.
+    """
+
+    def __init__(self, path=SQL_CACHE_PATH, ttl=SQL_CACHE_TTL, enabled=SQL_CACHE_ENABLED):
+        self.store = LLMResponseCache(path, ttl, SQL_CACHE_MEMORY_ITEMS) if enabled else None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "discards": 0}
+
+    def key(self, question, table_name, version):
+        payload = f"{table_name}\0{version}\0{normalize_question(question)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, outcome):
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def get(self, key):
+        if not self.store:
+            return None
+        sql, _ = self.store.get(key)
+        self._count("hits" if sql else "misses")
+        return sql
+
+    def put(self, key, sql):
+        if self.store and is_read_only_sql(sql):
+            self.store.put(key, sql.strip().rstrip(";"))
+            self._count("stores")
+
+    def discard(self, key):
+        if self.store:
+            self.store.delete(key)
+            self._count("discards")
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+nl_sql_cache = NlSqlCache()
+
+
+def _nl_sql_metrics():
+    stats = nl_sql_cache.stats()
+    return [
+        (
+            "nl_sql_cache_events",
+            "NL-to-SQL cache lookups and writes by outcome.",
+            [({"outcome": outcome}, value) for outcome, value in stats.items()],
+        )
+    ]
+
+
+metrics.register_collector(_nl_sql_metrics)
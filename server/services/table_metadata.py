@@ -0,0 +1,72 @@
+import hashlib
+import os
+import threading
+import time
+
+TABLE_METADATA_TTL = float(os.getenv("TABLE_METADATA_TTL", 300))
+
+
+class TableMetadataCache:
+    """
+    Column names and types per role table, so prompt builders do not query the
+    catalog on every message. Each entry has a `version` derived from the schema:
+    it changes exactly when the columns do, which makes it safe to key
+    schema-dependent caches on. Entries are refreshed at ingestion time, dropped
+    on DDL and otherwise expire after `ttl` seconds.
+    """
+
+    def __init__(self, ttl=TABLE_METADATA_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, table_name, connection):
+        """Returns the table's metadata, loading it through `connection` on a miss; None if the table has no columns."""
+        with self._lock:
+            entry = self._entries.get(table_name)
+            if entry and time.monotonic() - entry["loaded_at"] < self.ttl:
+                return entry
+        return self.refresh(table_name, connection)
+
+    def refresh(self, table_name, connection):
+        entry = self._load(table_name, connection)
+        with self._lock:
+            if entry:
+                self._entries[table_name] = entry
+            else:
+                self._entries.pop(table_name, None)
+        return entry
+
+    def invalidate(self, table_name):
+        with self._lock:
+            self._entries.pop(table_name, None)
+
+    def _load(self, table_name, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                """
+                SELECT column_name, data_type
+                FROM information_schema.columns
+                WHERE table_name = %s
+                AND table_schema = 'public'
+                ORDER BY ordinal_position
+                """,
+                (table_name,),
+            )
+            columns = cursor.fetchall()
+        finally:
+            cursor.close()
+        if not columns:
+            return None
+
+        schema = "\n".join(f"{name}:{data_type}" for name, data_type in columns)
+        return {
+            "table_name": table_name,
+            "version": hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16],
+            "columns": columns,
+            "loaded_at": time.monotonic(),
+        }
+
+
+table_metadata = TableMetadataCache()
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain_core")
+agent_events = pytest.importorskip("services.agent_events")
+prompt_compactor = pytest.importorskip("services.prompt_compactor")
+
+
+def run_query(handler, query, output):
+    handler.on_agent_action(SimpleNamespace(tool="sql_db_query", tool_input=query))
+    handler.on_tool_end(output)
+
+
+@pytest.fixture
+def handler():
+    return agent_events.AgentEventHandler(lambda event, data: None)
+
+
+def oversized_output():
+    return "x" * (prompt_compactor.prompt_budget("sql_rows") * 4 + 100)
+
+
+def test_last_successful_query_is_cacheable(handler):
+    run_query(handler, "SELECT DISTINCT skills FROM t", "[('python',)]")
+    run_query(handler, "SELECT name FROM t WHERE skills LIKE '%python%'", "[('asha',)]")
+    assert handler.cacheable_sql == "SELECT name FROM t WHERE skills LIKE '%python%'"
+
+
+def test_small_then_oversized_query_caches_nothing(handler):
+    run_query(handler, "SELECT DISTINCT skills FROM t", "[('python',)]")
+    run_query(handler, "SELECT name, skills, experience FROM t", oversized_output())
+    assert handler.cacheable_sql is None
+
+
+def test_small_then_failed_query_caches_nothing(handler):
+    run_query(handler, "SELECT DISTINCT skills FROM t", "[('python',)]")
+    run_query(handler, "SELECT nme FROM t", "Error: column \"nme\" does not exist")
+    assert handler.cacheable_sql is None
+
+
+def test_query_given_as_dict(handler):
+    run_query(handler, {"query": "SELECT 1"}, "[(1,)]")
+    assert handler.cacheable_sql == "SELECT 1"
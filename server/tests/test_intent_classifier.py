@@ -0,0 +1,44 @@
+import pytest
+
+from services.intent_classifier import IntentClassifier
+
+
+@pytest.fixture
+def classifier(tmp_path):
+    return IntentClassifier(log_path=str(tmp_path / "intent_examples.jsonl"))
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "email id of priya",
+        "Email address of rahul?",
+        "mail ids of all candidates",
+        "send an email to rahul about the next round",
+        "schedule an interview with rahul tomorrow at 3pm",
+    ],
+)
+def test_side_effecting_intents_are_never_chosen_locally(classifier, question):
+    assert classifier.classify(question) not in ("gmail", "calendar")
+
+
+@pytest.mark.parametrize(
+    "question",
+    ["email id of priya", "Email address of rahul?", "mail ids of all candidates"],
+)
+def test_email_lookups_do_not_match_the_gmail_rule(classifier, question):
+    intent, _, source = classifier.predict(question)
+    assert not (intent == "gmail" and source == "rules")
+
+
+def test_highlight_without_resume_is_not_bestfit_rule(classifier):
+    intent, _, source = classifier.predict("highlight candidates with aws experience")
+    assert not (intent == "bestfit" and source == "rules")
+
+
+def test_highlight_in_resume_is_bestfit(classifier):
+    assert classifier.classify("highlight the relevant skills in arjun's resume") == "bestfit"
+
+
+def test_sql_rule(classifier):
+    assert classifier.classify("how many candidates know python") == "sql"